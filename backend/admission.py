@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from typing import List, Optional
+
+from fastapi import FastAPI, status
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+from backend.dbutil import pool_stats
+from backend.metrics import Counter
+
+logger = logging.getLogger()
+
+# seconds a request can wait for a slot before being rejected
+QUEUE_TIMEOUT = 2
+
+REQUESTS_SHED = Counter(
+    'requests_shed_total',
+    'Requests rejected because the server was overloaded',
+    ('endpoints',))
+
+
+class Overloaded(Exception):
+    def __init__(self, endpoints: str, retry_after: int):
+        super().__init__(f'Too many requests to the {endpoints} endpoints, retry later')
+        self.retry_after = retry_after
+
+
+class EndpointClass:
+    """A group of endpoints sharing a concurrency limit.
+
+    It's used as a FastAPI dependency of the endpoints: at most
+    max_concurrent requests run at once and up to max_queued wait for
+    their turn, for at most QUEUE_TIMEOUT seconds. Beyond that, or when
+    more than shed_pool_waiting requests wait for a DB connection, or when
+    requests of a class with higher priority are waiting, the request is
+    rejected with 503 and a Retry-After header.
+
+    Must be created with AdmissionControl.add, which sets the priority.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            max_concurrent: int,
+            max_queued: int,
+            shed_pool_waiting: Optional[int],
+            retry_after: int,
+            higher: List['EndpointClass']):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.shed_pool_waiting = shed_pool_waiting
+        self.retry_after = retry_after
+        self.higher = higher
+        self.active = 0
+        self.queued = 0
+        # created on first use, to be bound to the loop of the app
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _reject(self, reason: str):
+        REQUESTS_SHED.inc(self.name)
+        logger.warning(f'Rejecting a request to the {self.name} endpoints, {reason}')
+        raise Overloaded(self.name, self.retry_after)
+
+    async def __call__(self):
+        if self.shed_pool_waiting is not None \
+                and pool_stats.waiting >= self.shed_pool_waiting:
+            self._reject(f'{pool_stats.waiting} requests waiting for the DB')
+        if any(c.queued > 0 for c in self.higher):
+            self._reject('requests with higher priority are waiting')
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        if self._slots.locked():
+            if self.queued >= self.max_queued:
+                self._reject(f'{self.queued} requests already waiting')
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), QUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                self._reject(f'no turn after {QUEUE_TIMEOUT} seconds')
+            finally:
+                self.queued -= 1
+        else:
+            await self._slots.acquire()
+        self.active += 1
+        try:
+            # the request runs here, streamed responses included
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+
+class AdmissionControl:
+    """The endpoint classes of an app, in order of priority."""
+
+    def __init__(self):
+        self.classes: List[EndpointClass] = []
+
+    def add(
+            self,
+            name: str,
+            max_concurrent: int,
+            max_queued: int,
+            shed_pool_waiting: Optional[int] = None,
+            retry_after: int = 1) -> EndpointClass:
+        """Add a class with lower priority than the ones already added."""
+        endpoint_class = EndpointClass(
+            name,
+            max_concurrent,
+            max_queued,
+            shed_pool_waiting,
+            retry_after,
+            higher=list(self.classes))
+        self.classes.append(endpoint_class)
+        return endpoint_class
+
+
+def attach_admission_control(app: FastAPI):
+    @app.exception_handler(Overloaded)
+    async def overloaded(request: Request, exc: Overloaded):
+        return JSONResponse(
+            dict(error=str(exc)),
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={'Retry-After': str(exc.retry_after)},
+        )
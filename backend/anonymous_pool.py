@@ -0,0 +1,54 @@
+import asyncio
+from random import sample
+from typing import List
+
+from backend.cache import TTLCache
+from backend.cards import draw_new_cards
+from backend.dbutil import get_conn
+
+# the anonymous user, who has no state
+ANONYMOUS_USER = 1
+
+
+class AnonymousCardPool:
+    """Pools of new cards for the anonymous user.
+
+    The anonymous user always gets the same new cards for a given target
+    language and set of source languages, so a pool of them is kept for
+    each combination and every draw is a random sample of it.
+    """
+
+    def __init__(self, pool_size: int, ttl: float, max_pools: int):
+        self.pool_size = pool_size
+        self._pools = TTLCache(max_pools, ttl)
+
+    async def _load(self, target_lang: str, source_langs: List[str]):
+        async with get_conn(readonly=True) as conn:
+            return await draw_new_cards(
+                conn,
+                ANONYMOUS_USER,
+                target_lang,
+                source_langs,
+                self.pool_size,
+                advance=False)
+
+    async def draw(
+            self, target_lang: str, source_langs: List[str], n: int) -> List[dict]:
+        key = (target_lang, tuple(sorted(source_langs)))
+        pool = self._pools.get(key)
+        if pool is None:
+            # store the task, concurrent draws wait for the same query
+            pool = asyncio.ensure_future(self._load(target_lang, source_langs))
+            pool.add_done_callback(
+                lambda task: self._forget_failed(key, task))
+            self._pools.put(key, pool)
+        # shielded, a draw cancelled when its client goes away must not
+        # cancel the query the other draws are waiting for
+        cards = await asyncio.shield(pool)
+        return sample(cards, min(n, len(cards)))
+
+    def _forget_failed(self, key: tuple, task: asyncio.Future):
+        """Drop a pool which could not be loaded, so the next draw retries."""
+        if task.cancelled() or task.exception() is not None:
+            if self._pools.get(key) is task:
+                self._pools.pop(key)
@@ -1,27 +1,91 @@
+import asyncio
+from datetime import datetime, timezone
 from hashlib import sha256
 import logging
 from pathlib import Path
 import secrets
 import string
-from typing import List
+from typing import AsyncIterator, List, Optional, Set, Tuple
 
-from fastapi import FastAPI, status
+from fastapi import Depends, FastAPI, status
 from fastapi.staticfiles import StaticFiles
 import orjson
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, conlist
 from starlette.requests import Request
-from starlette.responses import JSONResponse, RedirectResponse, StreamingResponse
-
-from backend.dbutil import get_conn, attach_db_cycle, get_sql
+from starlette.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
+from starlette.websockets import WebSocket, WebSocketDisconnect
+
+from backend.admission import AdmissionControl, attach_admission_control
+from backend.anonymous_pool import ANONYMOUS_USER, AnonymousCardPool
+from backend.cards import (
+    Frontier, advance_new_card_frontier, draw_new_cards, peek_new_cards,
+    reschedule_cards
+)
+from backend.config import Config
+from backend.dbutil import get_conn, attach_db_cycle
+from backend.export import gzipped, revlog_csv, revlog_jsonl
 from backend.auth import attach_auth
+from backend.languages import languages
+from backend.metrics import ANSWERS_REGISTERED, CARDS_DRAWN, attach_metrics
+from backend.pagination import decode_due_token, encode_due_token
+from backend.prefetch import BatchPrefetcher
+from backend.queries import queries
+from backend.responses import ORJSONResponse
+from backend.revlog_buffer import revlog_buffer
 
 logger = logging.getLogger()
 logger.setLevel(logging.DEBUG)
 
-app = FastAPI()
+config = Config()
+
+# how many never seen cards are given at every draw
+NEW_CARDS_PER_DRAW = 20
+
+# in a quiz session over WebSocket, more cards are sent when the client
+# has this many left to answer
+SESSION_CARDS_LOW_WATER = 5
+# answers in a quiz session stored together, unless the client is idle
+SESSION_ANSWER_BATCH = 10
+# seconds of inactivity after which the answers of a session are stored
+SESSION_FLUSH_INTERVAL = 5
+
+# seconds browsers and proxies can reuse the language list without asking
+LANGUAGES_MAX_AGE = 300
+
+# before anything in the DB
+EPOCH = datetime.min.replace(tzinfo=timezone.utc)
+
+anonymous_pool = AnonymousCardPool(
+    config.anonymous_pool_size,
+    config.anonymous_pool_ttl,
+    config.anonymous_pool_max_pools,
+)
+
+app = FastAPI(default_response_class=ORJSONResponse)
 
 attach_db_cycle(app)
 attach_auth(app)
+attach_metrics(app)
+attach_admission_control(app)
+
+# concurrency limits of the endpoints using the DB, from the highest priority
+# answers change the schedule, they're never shed because of the pool
+admission = AdmissionControl()
+answer_endpoints = admission.add(
+    'answer',
+    max_concurrent=4 * config.pg_pool_max_size,
+    max_queued=20 * config.pg_pool_max_size)
+card_endpoints = admission.add(
+    'card',
+    max_concurrent=2 * config.pg_pool_max_size,
+    max_queued=5 * config.pg_pool_max_size,
+    shed_pool_waiting=2 * config.pg_pool_max_size)
+bulk_endpoints = admission.add(
+    'export and stats',
+    max_concurrent=max(1, config.pg_pool_max_size // 4),
+    max_queued=config.pg_pool_max_size,
+    shed_pool_waiting=config.pg_pool_max_size // 2,
+    retry_after=10)
 
 # TODO later use a reverse proxy to serve static files
 # this works perfectly for now
@@ -43,13 +107,32 @@ def index():
 
 @app.get("/languages")
 async def get_languages(request: Request):
-    """Return list of all available languages and latest used ones."""
-    current_user = request.session.get('id', 1)
+    """Return the list of all available languages.
 
-    async with get_conn() as conn:
-        langs = await conn.fetch("""
-            SELECT iso693_3, name FROM language
-            """)
+    The list is the same for every user and changes rarely, the response
+    has an ETag and when the If-None-Match header has it the answer is 304
+    without body.
+    """
+    headers = {
+        'ETag': languages.etag,
+        'Cache-Control': f'public, max-age={LANGUAGES_MAX_AGE}',
+    }
+    if_none_match = request.headers.get('if-none-match', '')
+    # the weak comparison is used for GET, so W/ is irrelevant
+    etags = [e.strip().replace('W/', '', 1) for e in if_none_match.split(',')]
+    if languages.etag in etags or '*' in etags:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(languages.json, media_type='application/json', headers=headers)
+
+
+@app.get("/selected_languages", dependencies=[Depends(card_endpoints)])
+async def get_selected_languages(request: Request):
+    """Return the languages latest used by the user, if any."""
+    current_user = request.session.get('id', 1)
+    headers = {'Cache-Control': 'private, no-store'}
+    if current_user == ANONYMOUS_USER:
+        return ORJSONResponse({}, headers=headers)
+    async with get_conn(readonly=True) as conn:
         latest = await conn.fetchrow(
             """
             SELECT
@@ -58,81 +141,229 @@ async def get_languages(request: Request):
                 WHERE account_id = $1
             """,
             current_user)
-        if latest is None:
-            return dict(languages=langs)
-        else:
-            return dict(languages=langs, selected=latest)
+    if latest is None:
+        return ORJSONResponse({}, headers=headers)
+    return ORJSONResponse(dict(selected=latest), headers=headers)
 
 
 class QuizRequest(BaseModel):
     source_langs: List[str]
     target_lang: str
+    # maximum number of expired cards to return
+    page_size: int = Field(100, ge=1, le=500)
+    # returned by a previous call to get the next page of expired cards
+    continuation: Optional[str] = None
 
 
-@app.post("/draw_cards")
+@app.post("/draw_cards", dependencies=[Depends(card_endpoints)])
 async def draw_cards(qr: QuizRequest, request: Request):
     """Return the cards to test for this session.
 
     The selection contains both old cards to renew and a given number of
     brand new cards.
+
+    The old cards are returned in pages of at most page_size cards, the most
+    overdue first. When there may be more of them the X-Continuation-Token
+    header is set, and passing it as continuation returns the next page,
+    without new cards.
+
+    The first page is often drawn in background while the user answers the
+    previous one, see backend.prefetch.
     """
     current_user = request.session.get('id', 1)
+    if qr.continuation is None:
+        # a position before any card in the queue
+        after = (EPOCH, 0, 0)
+    else:
+        try:
+            after = decode_due_token(qr.continuation)
+        except ValueError as e:
+            return JSONResponse(
+                dict(error=str(e)),
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
 
-    async with get_conn() as conn:
-        cards_new = await conn.fetch(
-            get_sql('draw_new_cards'),
-            qr.target_lang,
-            qr.source_langs,
-            current_user)
-        if current_user == 1:
-            return cards_new
+    if current_user == ANONYMOUS_USER:
+        # the anonymous user has no expired cards
+        if qr.continuation is not None:
+            return ORJSONResponse([])
+        cards_new = await anonymous_pool.draw(
+            qr.target_lang, qr.source_langs, NEW_CARDS_PER_DRAW)
+        CARDS_DRAWN.inc('new', amount=len(cards_new))
+        return ORJSONResponse(cards_new)
 
-        # store the selected language so next time the menu can show it directly
-        await conn.execute(
-            'DELETE FROM latest_language WHERE account_id=$1', current_user)
-        await conn.execute(
-            """
-            INSERT INTO latest_language(
-                account_id, src_langs, tgt_lang
-                ) VALUES ($1, $2, $3)""",
-            current_user,
-            qr.source_langs,
-            qr.target_lang
-                )
-        expired_cards = await conn.fetch(
-            get_sql('get_expired_cards'),
-            current_user)
-        # TODO postgres insists in merging cards and languages before the join
-        # with the user card state which is very selective
-        # this is a workaround, the join is done in the backend
-        languages_l = await conn.fetch(
-            'SELECT id, name, iso693_3 FROM language')
-        src_langs = {}
-        to_lang_id = set()
-        to_lang_name = None
-        for lng in languages_l:
-            if lng['iso693_3'] == qr.target_lang:
-                to_lang_id = lng['id']
-                to_lang_name = lng['name']
-
-            if lng['iso693_3'] in qr.source_langs:
-                src_langs[lng['id']] = (lng['iso693_3'], lng['name'])
+    key = (qr.target_lang, tuple(qr.source_langs), qr.page_size)
+    prefetched = None
+    if qr.continuation is None and prefetcher is not None:
+        prefetched = await prefetcher.take(current_user, key)
 
+    async with get_conn() as conn:
+        if prefetched is not None:
+            (expired_cards, cards_new, frontier), answered = prefetched
+            # the languages are the ones of the previous draw, already saved
+            await advance_new_card_frontier(
+                conn, current_user, qr.target_lang, frontier)
+        else:
+            answered = set()
+            if qr.continuation is None:
+                cards_new = await draw_new_cards(
+                    conn,
+                    current_user,
+                    qr.target_lang,
+                    qr.source_langs,
+                    NEW_CARDS_PER_DRAW)
+            else:
+                cards_new = []
+            await _save_selected_languages(
+                conn, current_user, qr.source_langs, qr.target_lang)
+            expired_cards = await _expired_cards(
+                conn,
+                current_user,
+                qr.source_langs,
+                qr.target_lang,
+                after,
+                qr.page_size)
+
+    headers = {}
+    if len(expired_cards) == qr.page_size:
+        last = expired_cards[-1]
+        headers['X-Continuation-Token'] = encode_due_token(
+            last['next_review'], last['from_id'], last['to_id'])
+    for ec in expired_cards:
+        del ec['next_review']
+    if len(answered) > 0:
         expired_cards = [
-            dict(ec.items()) for ec in expired_cards
-            if ec['from_lang'] in src_langs and ec['to_lang'] == to_lang_id]
+            c for c in expired_cards if (c['from_id'], c['to_id']) not in answered]
+        cards_new = [
+            c for c in cards_new if (c['from_id'], c['to_id']) not in answered]
+    if qr.continuation is None and prefetcher is not None:
+        prefetcher.served(current_user, key, expired_cards + cards_new)
+
+    CARDS_DRAWN.inc('expired', amount=len(expired_cards))
+    CARDS_DRAWN.inc('new', amount=len(cards_new))
+    return ORJSONResponse(expired_cards + cards_new, headers=headers)
+
+
+async def _save_selected_languages(
+        conn, current_user: int, source_langs: List[str], target_lang: str):
+    """Store the selected languages, so next time the menu shows them."""
+    await conn.execute(
+        'DELETE FROM latest_language WHERE account_id=$1', current_user)
+    await conn.execute(
+        """
+        INSERT INTO latest_language(
+            account_id, src_langs, tgt_lang
+            ) VALUES ($1, $2, $3)""",
+        current_user,
+        source_langs,
+        target_lang
+            )
 
-        for ec in expired_cards:
-            ec['from_language_code'] = src_langs[ec['from_lang']][0]
-            ec['from_language'] = src_langs[ec['from_lang']][1]
 
-            ec['to_language_code'] = qr.target_lang
-            ec['to_language'] = to_lang_name
+async def _expired_cards(
+        conn,
+        current_user: int,
+        source_langs: List[str],
+        target_lang: str,
+        after: tuple,
+        limit: int) -> List[dict]:
+    """The expired cards of a user, the most overdue first.
 
-            del ec['from_lang']
-            del ec['to_lang']
+    Only the cards after the given (next_review, from_id, to_id) position
+    in the queue are returned, with their next_review.
+    """
+    # the languages names are taken from the cache, the query filters
+    # only by their ids
+    src_langs = {}
+    to_lang_id = None
+    to_lang_name = None
+    if target_lang in languages.by_iso:
+        to_lang_id, to_lang_name = languages.by_iso[target_lang]
+    for iso in source_langs:
+        if iso in languages.by_iso:
+            id_, name = languages.by_iso[iso]
+            src_langs[id_] = (iso, name)
+
+    expired_cards = await queries.get_expired_cards.fetch(
+        conn,
+        current_user,
+        to_lang_id,
+        list(src_langs),
+        *after,
+        limit)
+    expired_cards = [dict(ec.items()) for ec in expired_cards]
+    for ec in expired_cards:
+        ec['from_language_code'] = src_langs[ec['from_lang']][0]
+        ec['from_language'] = src_langs[ec['from_lang']][1]
+
+        ec['to_language_code'] = target_lang
+        ec['to_language'] = to_lang_name
+
+        del ec['from_lang']
+    return expired_cards
+
+
+async def _draw_batch(
+        conn,
+        current_user: int,
+        source_langs: List[str],
+        target_lang: str,
+        page_size: int,
+        exclude: Set[Tuple[int, int]],
+        ) -> Tuple[List[dict], List[dict], Frontier]:
+    """The most overdue expired cards and some new ones, skipping exclude.
+
+    The new cards are not marked as seen, it's done passing the returned
+    frontier to advance_new_card_frontier once they are given to the user.
+    """
+    # the excluded cards may still be expired or new, so they are fetched
+    # in addition to the page and then discarded
+    expired_cards = await _expired_cards(
+        conn,
+        current_user,
+        source_langs,
+        target_lang,
+        (EPOCH, 0, 0),
+        page_size + len(exclude))
+    expired_cards = [
+        ec for ec in expired_cards
+        if (ec['from_id'], ec['to_id']) not in exclude][:page_size]
+    cards_new, frontier = await peek_new_cards(
+        conn,
+        current_user,
+        target_lang,
+        source_langs,
+        NEW_CARDS_PER_DRAW + len(exclude))
+    cards_new = [
+        c for c in cards_new
+        if (c['from_id'], c['to_id']) not in exclude][:NEW_CARDS_PER_DRAW]
+    return expired_cards, cards_new, frontier
+
+
+async def _prefetch_batch(
+        current_user: int, key: tuple, exclude: Set[Tuple[int, int]]):
+    target_lang, source_langs, page_size = key
+    # not on the replica: it starts right after an answer is committed, a
+    # lagging replica would still have the cards just answered as new
+    async with get_conn() as conn:
+        return await _draw_batch(
+            conn,
+            current_user,
+            list(source_langs),
+            target_lang,
+            page_size,
+            exclude)
 
-        return expired_cards + cards_new
+
+if config.prefetch_batches:
+    prefetcher = BatchPrefetcher(
+        _prefetch_batch,
+        config.prefetch_after_fraction,
+        config.prefetch_ttl,
+        config.prefetch_max_users,
+    )
+else:
+    prefetcher = None
 
 
 class CardAnswer(BaseModel):
@@ -144,7 +375,7 @@ class CardAnswer(BaseModel):
     repetition: bool
 
 
-@app.post("/register_answer")
+@app.post("/register_answer", dependencies=[Depends(answer_endpoints)])
 async def register_answer(ans: CardAnswer, request: Request):
     """Register the answer an user gave to a card.
 
@@ -153,47 +384,184 @@ async def register_answer(ans: CardAnswer, request: Request):
     mistakes are the most common.
     """
     current_user = request.session.get('id', 1)
+    if revlog_buffer is not None and (
+            current_user == ANONYMOUS_USER or ans.repetition):
+        # only a revlog row to queue, no need for a connection at all
+        await store_answers(None, current_user, [ans])
+        return 'OK'
+    async with get_conn() as conn:
+        async with conn.transaction():
+            await store_answers(conn, current_user, [ans])
+    _answered(current_user, [ans])
+    return 'OK'
+
+
+@app.post("/register_answers", dependencies=[Depends(answer_endpoints)])
+async def register_answers(
+        answers: conlist(CardAnswer, max_items=1000), request: Request):
+    """Register all the answers given during a session at once.
+
+    The answers are stored in the order they were given, the result is the
+    same as calling /register_answer for each of them, but with a single
+    request and transaction.
+    """
+    current_user = request.session.get('id', 1)
     async with get_conn() as conn:
-        await conn.execute(
-            get_sql('insert_revlog'),
-            ans.from_id,
-            ans.to_id,
+        async with conn.transaction():
+            await store_answers(conn, current_user, answers)
+    _answered(current_user, answers)
+    return 'OK'
+
+
+def _answered(current_user: int, answers: List[CardAnswer]):
+    """Let the prefetcher know about answers, once they are committed."""
+    if prefetcher is not None and current_user != ANONYMOUS_USER:
+        prefetcher.answered(
+            current_user,
+            [(ans.from_id, ans.to_id) for ans in answers if not ans.repetition])
+
+
+async def store_answers(conn, current_user: int, answers: List[CardAnswer]):
+    """Store a batch of answers and reschedule the cards.
+
+    Must run in a transaction. Repetitions in the same session do not affect
+    further the state, and the anonymous user has no state at all.
+    """
+    if revlog_buffer is not None:
+        for ans in answers:
+            await revlog_buffer.add(
+                ans.from_id,
+                ans.to_id,
+                current_user,
+                ans.given_answers,
+                ans.expected_answers,
+                ans.correct
+            )
+    else:
+        await queries.insert_revlogs.execute(
+            conn,
             current_user,
-            ans.given_answers,
-            ans.expected_answers,
-            ans.correct
+            [ans.from_id for ans in answers],
+            [ans.to_id for ans in answers],
+            [orjson.dumps(ans.given_answers).decode() for ans in answers],
+            [orjson.dumps(ans.expected_answers).decode() for ans in answers],
+            [ans.correct for ans in answers],
         )
-        # user 1 is the anonymous user, so there's no revision time update
-        if current_user == 1:
-            return 'OK'
-        # repetitions in the same session do not affect further the state
+    for ans in answers:
+        ANSWERS_REGISTERED.inc('true' if ans.correct else 'false')
+    if current_user == ANONYMOUS_USER:
+        return
+    # only the first non repeated answer to a card affects its state
+    to_reschedule = {}
+    for ans in answers:
         if not ans.repetition:
-            if ans.correct:
-                # correct, roughly equivalent to "Easy" in Anki
-                # EF = EF + 0.15
-                #  if new, EF is 2.5 + 0.15 = 2.65
-                # I = 1 iif new card
-                # I = 6 iif I = 1
-                # I = round(I * EF) iif I > 1 and not new card
-                # next review in I days
-                await conn.execute(
-                    get_sql('reschedule_correct_card'),
-                    ans.from_id,
-                    ans.to_id,
-                    current_user
-                )
-            else:
-                # not correct, roughly equivalent to "Again" in Anki
-                # EF = max(1.3, EF - 0.2)
-                #  if new, EF is assumed 2.5, so will become 2.5 - 0.2 = 2.3
-                # I = 1
-                await conn.execute(
-                    get_sql('reschedule_wrong_card'),
-                    ans.from_id,
-                    ans.to_id,
-                    current_user
-                )
-        return 'OK'
+            to_reschedule.setdefault((ans.from_id, ans.to_id), ans.correct)
+    if len(to_reschedule) > 0:
+        await reschedule_cards(
+            conn,
+            current_user,
+            list(to_reschedule.keys()),
+            list(to_reschedule.values()),
+        )
+
+
+async def _next_session_cards(
+        current_user: int, qr: QuizRequest, exclude: set) -> List[dict]:
+    """The next cards of a quiz session, without those in exclude."""
+    if current_user == ANONYMOUS_USER:
+        cards_new = await anonymous_pool.draw(
+            qr.target_lang, qr.source_langs, NEW_CARDS_PER_DRAW)
+        cards_new = [
+            c for c in cards_new if (c['from_id'], c['to_id']) not in exclude]
+        CARDS_DRAWN.inc('new', amount=len(cards_new))
+        return cards_new
+
+    async with get_conn() as conn:
+        expired_cards, cards_new, frontier = await _draw_batch(
+            conn,
+            current_user,
+            qr.source_langs,
+            qr.target_lang,
+            qr.page_size,
+            exclude)
+        await advance_new_card_frontier(
+            conn, current_user, qr.target_lang, frontier)
+    for ec in expired_cards:
+        del ec['next_review']
+    CARDS_DRAWN.inc('expired', amount=len(expired_cards))
+    CARDS_DRAWN.inc('new', amount=len(cards_new))
+    return expired_cards + cards_new
+
+
+@app.websocket("/quiz_session")
+async def quiz_session(websocket: WebSocket):
+    """Run a whole quiz over a WebSocket.
+
+    The client sends first the languages, like the body of /draw_cards
+    without continuation, and then every answer as soon as it's given, like
+    the body of /register_answer.
+    The server sends lists of cards: the first one right away and the next
+    ones when the client has only a few cards left to answer, so it never
+    waits. An empty list means there are no more cards.
+
+    The answers are stored in batches, when there are enough of them, when
+    the client is idle for a while, before drawing new cards (so the cards
+    just answered are not drawn again) and when the socket is closed.
+    A connection is taken from the pool only for the time of each batch.
+    """
+    await websocket.accept()
+    current_user = websocket.session.get('id', 1)
+    try:
+        qr = QuizRequest(**await websocket.receive_json())
+    except (ValueError, TypeError, WebSocketDisconnect):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    if current_user != ANONYMOUS_USER:
+        async with get_conn() as conn:
+            await _save_selected_languages(
+                conn, current_user, qr.source_langs, qr.target_lang)
+
+    answers: List[CardAnswer] = []
+    # cards sent to the client and not answered yet
+    unanswered = set()
+
+    async def flush():
+        if len(answers) == 0:
+            return
+        async with get_conn() as conn:
+            async with conn.transaction():
+                await store_answers(conn, current_user, answers)
+        answers.clear()
+
+    async def send_cards() -> bool:
+        cards = await _next_session_cards(current_user, qr, unanswered)
+        unanswered.update((c['from_id'], c['to_id']) for c in cards)
+        await websocket.send_text(orjson.dumps(cards).decode())
+        return len(cards) > 0
+
+    try:
+        more_cards = await send_cards()
+        while True:
+            try:
+                message = await asyncio.wait_for(
+                    websocket.receive_json(), SESSION_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                await flush()
+                continue
+            ans = CardAnswer(**message)
+            answers.append(ans)
+            unanswered.discard((ans.from_id, ans.to_id))
+            if len(answers) >= SESSION_ANSWER_BATCH:
+                await flush()
+            if more_cards and len(unanswered) <= SESSION_CARDS_LOW_WATER:
+                await flush()
+                more_cards = await send_cards()
+    except WebSocketDisconnect:
+        pass
+    except (ValueError, TypeError):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+    finally:
+        await flush()
 
 
 class IssueReport(BaseModel):
@@ -203,7 +571,7 @@ class IssueReport(BaseModel):
     issue_type: str
 
 
-@app.post("/report_issue")
+@app.post("/report_issue", dependencies=[Depends(card_endpoints)])
 async def report_issue(issue: IssueReport, request: Request):
     current_user = request.session.get('id', 1)
     async with get_conn() as conn:
@@ -329,7 +697,7 @@ class NoteAboutCard(BaseModel):
     explanation: str
 
 
-@app.post("/take_note")
+@app.post("/take_note", dependencies=[Depends(card_endpoints)])
 async def take_note(note: NoteAboutCard, request: Request):
     """Store a note about a card.
 
@@ -345,8 +713,8 @@ async def take_note(note: NoteAboutCard, request: Request):
             status_code=status.HTTP_403_UNAUTHORIZED,
         )
     async with get_conn() as conn:
-        await conn.execute(
-            get_sql('upsert_card_notes'),
+        await queries.upsert_card_notes.execute(
+            conn,
             note.from_id,
             note.to_id,
             current_user,
@@ -355,7 +723,7 @@ async def take_note(note: NoteAboutCard, request: Request):
         )
 
 
-@app.get("/my_revision_stats")
+@app.get("/my_revision_stats", dependencies=[Depends(bulk_endpoints)])
 async def my_revision_stats(request: Request):
     """Provide daily revision stats.
 
@@ -368,19 +736,42 @@ async def my_revision_stats(request: Request):
             dict(error='Not logged in, cannot get statistics'),
             status_code=status.HTTP_403_UNAUTHORIZED,
         )
-    async with get_conn() as conn:
-        return await conn.fetch(
-            get_sql('get_user_stats'),
+    async with get_conn(readonly=True) as conn:
+        stats = await queries.get_user_stats.fetch(
+            conn,
             current_user,
         )
+    return ORJSONResponse(stats)
+
+
+def _revlog_response(
+        request: Request,
+        chunks: AsyncIterator[bytes],
+        media_type: str) -> StreamingResponse:
+    """Stream a revision log export, compressed if the client accepts it."""
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        return StreamingResponse(
+            gzipped(chunks),
+            media_type=media_type,
+            headers={'Content-Encoding': 'gzip', 'Vary': 'Accept-Encoding'})
+    return StreamingResponse(
+        chunks, media_type=media_type, headers={'Vary': 'Accept-Encoding'})
 
 
-@app.get("/download/revision_logs.json")
-async def revision_logs(request: Request):
+@app.get("/download/revision_logs.json", dependencies=[Depends(bulk_endpoints)])
+async def revision_logs(
+        request: Request,
+        since: Optional[datetime] = None,
+        since_from_id: int = 0,
+        since_to_id: int = 0):
     """Retrieve the revision log as a JSONL stream.
 
     It contains the revision timestamp and content, and the associated
     Tatoeba sentence ids.
+    The reviews are in chronological order, and only the ones after since
+    are returned, if given: an interrupted download can be resumed passing
+    the review_time, from_id and to_id of the last review received as since,
+    since_from_id and since_to_id, reviews can have the same review_time.
     """
     current_user = request.session.get('id', 1)
     if current_user == 1:
@@ -388,18 +779,29 @@ async def revision_logs(request: Request):
             dict(error='Not logged in, cannot get revision data'),
             status_code=status.HTTP_403_UNAUTHORIZED,
         )
+    return _revlog_response(
+        request,
+        revlog_jsonl(current_user, (since or EPOCH, since_from_id, since_to_id)),
+        'text/plain; charset=utf8')
 
-    async def stream_revlogs(current_user):
-        print('Streaming for user', current_user)
-        async with get_conn() as conn:
-            async with conn.transaction():
-                nl = '\n'.encode()
-                async for record in conn.cursor(
-                    get_sql('get_all_user_reviews'),
-                        current_user):
-                    print(record)
-                    yield orjson.dumps(dict(record)) + nl
 
-    return StreamingResponse(
-        stream_revlogs(current_user),
-        media_type='text/plain; charset=utf8')
+@app.get("/download/revision_logs.csv", dependencies=[Depends(bulk_endpoints)])
+async def revision_logs_csv(
+        request: Request,
+        since: Optional[datetime] = None,
+        since_from_id: int = 0,
+        since_to_id: int = 0):
+    """Retrieve the revision log as a CSV stream.
+
+    The content and the since parameters are the same of the JSONL version.
+    """
+    current_user = request.session.get('id', 1)
+    if current_user == 1:
+        return JSONResponse(
+            dict(error='Not logged in, cannot get revision data'),
+            status_code=status.HTTP_403_UNAUTHORIZED,
+        )
+    return _revlog_response(
+        request,
+        revlog_csv(current_user, (since or EPOCH, since_from_id, since_to_id)),
+        'text/csv; charset=utf8')
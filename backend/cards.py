@@ -0,0 +1,154 @@
+from random import Random
+from typing import Dict, List, Optional, Tuple
+
+from asyncpg.connection import Connection
+import numpy as np
+
+from backend.config import Config
+from backend.queries import queries
+from backend.languages import languages
+from backend.scheduler import STATE_FIELDS, get_scheduler, new_states
+
+config = Config()
+
+scheduler = get_scheduler(config.scheduler)
+
+# source language id -> [start, first unseen after it, first unseen before it]
+Frontier = Dict[int, List[Optional[int]]]
+
+
+def start_fraction(account_id: int) -> float:
+    """Where a user starts in the random order of new cards.
+
+    It's a fraction of the card sequence, always the same for a given user.
+    """
+    return Random(account_id).random()
+
+
+async def draw_new_cards(
+        conn: Connection,
+        account_id: int,
+        target_lang: str,
+        source_langs: List[str],
+        n: int,
+        advance: bool = True,
+        ) -> List[dict]:
+    """Draw up to n cards never seen by the user.
+
+    When advance is True the frontiers of the user are moved to the drawn
+    cards, so the next draws skip the cards seen before them.
+    """
+    cards, frontier = await peek_new_cards(
+        conn, account_id, target_lang, source_langs, n)
+    if advance:
+        await advance_new_card_frontier(conn, account_id, target_lang, frontier)
+    return cards
+
+
+async def peek_new_cards(
+        conn: Connection,
+        account_id: int,
+        target_lang: str,
+        source_langs: List[str],
+        n: int,
+        ) -> Tuple[List[dict], Frontier]:
+    """Draw up to n cards never seen by the user, without moving on.
+
+    Returns the cards and the frontier to pass to advance_new_card_frontier
+    once they are actually given to the user.
+    A side of the start with no cards left gets a frontier past its last
+    card, so the cards seen there are not scanned again.
+    """
+    rows = await queries.draw_new_cards.fetch(
+        conn,
+        target_lang,
+        source_langs,
+        account_id,
+        n,
+        start_fraction(account_id))
+    cards = []
+    frontier = {}
+    max_seqs = {}
+    for row in rows:
+        fr = frontier.setdefault(
+            row['from_lang'], [row['start_seq'], None, None])
+        max_seqs[row['from_lang']] = row['max_seq']
+        if row['from_id'] is None:
+            # no cards for this language
+            continue
+        side = 2 if row['wrapped'] else 1
+        if fr[side] is None or row['seq'] < fr[side]:
+            fr[side] = row['seq']
+        card = dict(row.items())
+        for internal in ('from_lang', 'seq', 'wrapped', 'start_seq', 'max_seq'):
+            del card[internal]
+        cards.append(card)
+    # the cards after the start come first, so when fewer than n cards or
+    # some before the start were drawn those after it were all there
+    after_complete = len(cards) < n or any(row['wrapped'] for row in rows)
+    before_complete = len(cards) < n
+    for from_lang, fr in frontier.items():
+        if fr[1] is None and after_complete and max_seqs[from_lang] is not None:
+            fr[1] = max_seqs[from_lang] + 1
+        if fr[2] is None and before_complete:
+            fr[2] = fr[0]
+    return cards, frontier
+
+
+async def advance_new_card_frontier(
+        conn: Connection,
+        account_id: int,
+        target_lang: str,
+        frontier: Frontier,
+        ):
+    """Move the frontiers of the user past the cards drawn with them."""
+    if len(frontier) == 0:
+        return
+    await queries.advance_new_card_frontier.execute(
+        conn,
+        account_id,
+        languages.by_iso[target_lang][0],
+        list(frontier.keys()),
+        [fr[0] for fr in frontier.values()],
+        [fr[1] for fr in frontier.values()],
+        [fr[2] for fr in frontier.values()])
+
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+async def reschedule_cards(
+        conn: Connection,
+        account_id: int,
+        cards: List[Tuple[int, int]],
+        correct: List[bool],
+        ):
+    """Update the schedule of some cards after an answer to each of them.
+
+    Must run in a transaction, the state of the cards is locked between
+    reading and updating it. Every card must appear only once.
+    """
+    from_ids = [from_id for from_id, _ in cards]
+    to_ids = [to_id for _, to_id in cards]
+    position = {card: idx for idx, card in enumerate(cards)}
+    states = new_states(len(cards))
+    elapsed_days = np.zeros(len(cards))
+    for row in await queries.get_card_states.fetch(
+            conn, account_id, from_ids, to_ids):
+        idx = position[(row['from_id'], row['to_id'])]
+        for field in STATE_FIELDS:
+            if row[field] is not None:
+                states[field][idx] = row[field]
+        if row['elapsed_days'] is not None:
+            elapsed_days[idx] = row['elapsed_days']
+
+    states, due_days = scheduler.review(
+        states, np.array(correct, dtype=bool), elapsed_days)
+    await queries.upsert_card_states.execute(
+        conn,
+        account_id,
+        from_ids,
+        to_ids,
+        due_days.tolist(),
+        *[_nullable(states[field]) for field in STATE_FIELDS])
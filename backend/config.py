@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import (
     BaseSettings, PostgresDsn, Field
 )
@@ -8,5 +10,34 @@ class Config(BaseSettings):
     sso_google_client_id: str = Field(..., env='SSO_GOOGLE_CLIENT_ID')
     sso_google_secret: str = Field(..., env='SSO_GOOGLE_SECRET')
     secret_session_key: str = Field(..., env='SECRET_SESSION_KEY')
-
-
+    # pools of new cards shown to the anonymous user
+    anonymous_pool_size: int = Field(200, env='ANONYMOUS_POOL_SIZE')
+    anonymous_pool_ttl: float = Field(600, env='ANONYMOUS_POOL_TTL')
+    anonymous_pool_max_pools: int = Field(1000, env='ANONYMOUS_POOL_MAX_POOLS')
+    # write the revlog rows in batches from a background task, the answers of
+    # the last revlog_flush_interval seconds are lost in case of crash
+    revlog_write_behind: bool = Field(False, env='REVLOG_WRITE_BEHIND')
+    revlog_buffer_max_rows: int = Field(10_000, env='REVLOG_BUFFER_MAX_ROWS')
+    revlog_flush_rows: int = Field(500, env='REVLOG_FLUSH_ROWS')
+    revlog_flush_interval: float = Field(2, env='REVLOG_FLUSH_INTERVAL')
+    # spaced repetition algorithm, see backend.scheduler
+    scheduler: str = Field('sm2', env='SCHEDULER')
+    # connection pool, the defaults are the ones of asyncpg
+    pg_pool_min_size: int = Field(10, env='PG_POOL_MIN_SIZE')
+    pg_pool_max_size: int = Field(10, env='PG_POOL_MAX_SIZE')
+    pg_pool_max_queries: int = Field(50_000, env='PG_POOL_MAX_QUERIES')
+    pg_pool_max_inactive_lifetime: float = Field(300, env='PG_POOL_MAX_INACTIVE_LIFETIME')
+    # seconds to wait for a connection before failing, and before logging it
+    pg_pool_acquire_timeout: float = Field(10, env='PG_POOL_ACQUIRE_TIMEOUT')
+    pg_pool_slow_acquire: float = Field(0.1, env='PG_POOL_SLOW_ACQUIRE')
+    pg_command_timeout: float = Field(10, env='PG_COMMAND_TIMEOUT')
+    # draw the next batch of a user in background once this fraction of the
+    # current one is answered, keeping it for at most prefetch_ttl seconds
+    prefetch_batches: bool = Field(True, env='PREFETCH_BATCHES')
+    prefetch_after_fraction: float = Field(0.75, env='PREFETCH_AFTER_FRACTION')
+    prefetch_ttl: float = Field(300, env='PREFETCH_TTL')
+    prefetch_max_users: int = Field(10_000, env='PREFETCH_MAX_USERS')
+    # optional read replica for the read-only queries, not used when its
+    # replay lags more than pg_replica_max_lag seconds
+    pg_replica_conn_str: Optional[PostgresDsn] = Field(None, env='PG_REPLICA_CONN_STR')
+    pg_replica_max_lag: float = Field(5, env='PG_REPLICA_MAX_LAG')
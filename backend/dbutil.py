@@ -1,53 +1,296 @@
+import asyncio
 from contextlib import asynccontextmanager
-from functools import lru_cache
-import importlib.resources as pkg_resources
 import logging
+from time import perf_counter
 
 import asyncpg
 from fastapi import FastAPI
 
-import backend.sql
 from backend.config import Config
+from backend.languages import LANGUAGE_CHANNEL, languages
+from backend.metrics import ACQUIRE_TIMEOUTS, ACQUIRE_WAIT, CONNECTION_HOLD, Gauge
+from backend.queries import queries
+from backend.revlog_buffer import revlog_buffer
+# re-exported, the rest of the app imports it from here
+from backend.sql import get_sql  # noqa: F401
 
 config = Config()
 
 __db_pool: asyncpg.pool.Pool = None
+# for read-only queries, None when there's no replica
+__replica_pool: asyncpg.pool.Pool = None
+# dedicated connection, a pooled one cannot keep listening
+__listen_conn: asyncpg.connection.Connection = None
+# set when the listening connection is closed, to open it again right away
+__listen_conn_lost: asyncio.Event = None
 
 logger = logging.getLogger()
 
+# seconds between checks of the replica lag
+REPLICA_CHECK_INTERVAL = 1
+
+# seconds between checks of the connection listening for notifications, a
+# connection dropped by the network is noticed only when used
+LISTEN_CHECK_INTERVAL = 10
+
+# replication lag in seconds, 0 when all the received WAL was applied, so an
+# idle primary does not look lagging
+REPLICA_LAG_SQL = '''
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(
+        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+def _create_pool(dsn: str) -> asyncpg.pool.Pool:
+    return asyncpg.create_pool(
+        dsn=dsn,
+        min_size=config.pg_pool_min_size,
+        max_size=config.pg_pool_max_size,
+        max_queries=config.pg_pool_max_queries,
+        max_inactive_connection_lifetime=config.pg_pool_max_inactive_lifetime,
+        command_timeout=config.pg_command_timeout,
+        init=queries.prepare_all,
+        )
+
 
 def attach_db_cycle(app: FastAPI):
+    monitors = []
+
     @app.on_event("startup")
     async def on_app_startup():
-        global __db_pool
+        global __db_pool, __listen_conn_lost
         logger.debug('App did startup, creating connection pool')
-        __db_pool = await asyncpg.create_pool(
-            dsn=config.pg_conn_str,
-            command_timeout=10
-            )
+        __db_pool = await _create_pool(config.pg_conn_str)
+        if config.pg_replica_conn_str is not None:
+            # the monitor creates the replica pool, retrying if it's down
+            monitors.append(asyncio.ensure_future(_monitor_replica()))
+        async with get_conn() as conn:
+            await languages.load(conn)
+        # created here to be bound to the loop of the app
+        __listen_conn_lost = asyncio.Event()
+        await _listen()
+        monitors.append(asyncio.ensure_future(_monitor_listen_conn()))
+        if revlog_buffer is not None:
+            revlog_buffer.start(get_conn)
 
     @app.on_event("shutdown")
     async def on_app_shutdown():
+        if revlog_buffer is not None:
+            logger.debug('App shutting down, flushing the revlog buffer')
+            await revlog_buffer.stop()
         logger.debug('App shutting down, terminating connection pool')
+        for task in monitors:
+            task.cancel()
+        if __listen_conn is not None:
+            await __listen_conn.close()
+        if __replica_pool is not None:
+            __replica_pool.terminate()
         __db_pool.terminate()
 
 
+async def _reload_languages():
+    async with get_conn() as conn:
+        await languages.load(conn)
+
+
+def _log_reload_failure(task: asyncio.Future):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Could not reload the languages', exc_info=task.exception())
+
+
+def _on_language_change(conn, pid, channel, payload):
+    logger.info('Language table changed, reloading the cache')
+    asyncio.ensure_future(_reload_languages()).add_done_callback(
+        _log_reload_failure)
+
+
+async def _listen():
+    """Open the connection listening for changes of the language table."""
+    global __listen_conn
+    __listen_conn = await asyncpg.connect(dsn=config.pg_conn_str)
+    __listen_conn.add_termination_listener(
+        lambda conn: __listen_conn_lost.set())
+    await __listen_conn.add_listener(LANGUAGE_CHANNEL, _on_language_change)
+
+
+async def _monitor_listen_conn():
+    """Open again the listening connection when it's lost.
+
+    Then the languages are reloaded, since notifications may have been
+    missed in the meantime.
+    """
+    global __listen_conn
+    reload = False
+    while True:
+        try:
+            await asyncio.wait_for(
+                __listen_conn_lost.wait(), LISTEN_CHECK_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        __listen_conn_lost.clear()
+        try:
+            if __listen_conn is None or __listen_conn.is_closed():
+                logger.warning('Lost the connection listening for language changes')
+                __listen_conn = None
+                await _listen()
+                reload = True
+            else:
+                await __listen_conn.execute(
+                    'SELECT 1', timeout=LISTEN_CHECK_INTERVAL)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('The connection listening for language changes failed')
+            if __listen_conn is not None:
+                __listen_conn.terminate()
+            continue
+        if reload:
+            try:
+                await _reload_languages()
+                reload = False
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Could not reload the languages')
+
+
+class ReplicaStatus:
+    """Whether the read replica can be used, checked periodically."""
+
+    def __init__(self):
+        self.usable = False
+        self.lag = 0.0
+
+    def update(self, lag: float):
+        self.lag = lag
+        usable = lag <= config.pg_replica_max_lag
+        if usable != self.usable:
+            logger.warning(
+                f'Read replica {"usable" if usable else "not usable"}, '
+                f'lag {lag:.1f} seconds')
+        self.usable = usable
+
+    def failed(self):
+        if self.usable:
+            logger.exception('Read replica not usable')
+        self.usable = False
+
+
+replica_status = ReplicaStatus()
+
+Gauge(
+    'db_replica_lag_seconds',
+    'Replication lag of the read replica',
+    lambda: replica_status.lag)
+
+
+async def _monitor_replica():
+    global __replica_pool
+    while True:
+        try:
+            if __replica_pool is None:
+                __replica_pool = await _create_pool(config.pg_replica_conn_str)
+            async with __replica_pool.acquire() as conn:
+                replica_status.update(float(await conn.fetchval(REPLICA_LAG_SQL)))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            replica_status.failed()
+        await asyncio.sleep(REPLICA_CHECK_INTERVAL)
+
+
+class PoolStats:
+    """How long requests wait for a connection and how long they hold it.
+
+    The times are in seconds and accumulated since the app started.
+    """
+
+    def __init__(self):
+        self.acquired = 0
+        self.acquire_timeouts = 0
+        self.acquire_wait_total = 0.0
+        self.acquire_wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        # current values
+        self.waiting = 0
+        self.in_use = 0
+
+    @property
+    def saturation(self) -> float:
+        """Fraction of the maximum number of connections in use."""
+        return self.in_use / config.pg_pool_max_size
+
+
+pool_stats = PoolStats()
+replica_pool_stats = PoolStats()
+
+Gauge(
+    'db_pool_connections_in_use',
+    'Connections of the pool currently acquired',
+    lambda: pool_stats.in_use)
+Gauge(
+    'db_pool_requests_waiting',
+    'Requests currently waiting for a connection',
+    lambda: pool_stats.waiting)
+
+
 @asynccontextmanager
-async def get_conn():
-    conn = await __db_pool.acquire()
+async def get_conn(readonly: bool = False):
+    """A connection of the pool, released when exiting the context.
+
+    With readonly, the connection comes from the read replica when there's
+    one and it's not lagging, otherwise from the primary. The data read
+    from the replica can be up to pg_replica_max_lag seconds old.
+    """
+    pool, stats = __db_pool, pool_stats
+    conn = None
+    if readonly and replica_status.usable:
+        try:
+            conn = await _acquire(__replica_pool, replica_pool_stats)
+            pool, stats = __replica_pool, replica_pool_stats
+        except (OSError, asyncpg.exceptions.PostgresConnectionError):
+            replica_status.failed()
+    if conn is None:
+        conn = await _acquire(pool, stats)
+    acquired = perf_counter()
     try:
         yield conn
     finally:
-        await __db_pool.release(conn)
-
+        await pool.release(conn)
+        stats.in_use -= 1
+        hold = perf_counter() - acquired
+        stats.hold_total += hold
+        stats.hold_max = max(stats.hold_max, hold)
+        CONNECTION_HOLD.observe(hold)
 
-@lru_cache()
-def get_sql(query_name: str) -> str:
-    """Read the content of a stored query as a string.
 
-    SQL comments are stripped.
-    """
-    query = pkg_resources.read_text(
-        backend.sql, f'{query_name}.sql').split('\n')
-    query = [line for line in query if not line.startswith('--')]
-    return '\n'.join(query)
+async def _acquire(pool: asyncpg.pool.Pool, stats: PoolStats):
+    start = perf_counter()
+    stats.waiting += 1
+    try:
+        conn = await pool.acquire(timeout=config.pg_pool_acquire_timeout)
+    except asyncio.TimeoutError:
+        stats.acquire_timeouts += 1
+        ACQUIRE_TIMEOUTS.inc()
+        logger.warning(
+            f'No connection available after {config.pg_pool_acquire_timeout} seconds, '
+            f'{stats.waiting} requests waiting')
+        raise
+    finally:
+        stats.waiting -= 1
+    wait = perf_counter() - start
+    stats.acquired += 1
+    stats.acquire_wait_total += wait
+    stats.acquire_wait_max = max(stats.acquire_wait_max, wait)
+    stats.in_use += 1
+    ACQUIRE_WAIT.observe(wait)
+    if wait > config.pg_pool_slow_acquire:
+        logger.warning(
+            f'Waited {wait:.3f} seconds for a connection, '
+            f'pool saturation {stats.saturation:.0%}, '
+            f'{stats.waiting} requests waiting')
+    return conn
@@ -0,0 +1,85 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Tuple
+import zlib
+
+import orjson
+
+from backend.dbutil import get_conn, get_sql
+from backend.queries import queries
+
+# rows fetched from the cursor at every round-trip
+BATCH_SIZE = 2000
+
+# chunks of COPY output waiting to be sent to the client
+MAX_PENDING_CHUNKS = 16
+
+
+# position of a review in the export: review_time, from_id, to_id
+ReviewKey = Tuple[datetime, int, int]
+
+
+async def revlog_jsonl(account_id: int, after: ReviewKey) -> AsyncIterator[bytes]:
+    """Stream the reviews of a user after a given one, as JSONL."""
+    nl = '\n'.encode()
+    async with get_conn(readonly=True) as conn:
+        async with conn.transaction():
+            cursor = await queries.get_all_user_reviews.cursor(
+                conn, account_id, *after)
+            while True:
+                records = await cursor.fetch(BATCH_SIZE)
+                if len(records) == 0:
+                    break
+                yield b''.join(orjson.dumps(dict(r)) + nl for r in records)
+
+
+async def revlog_csv(account_id: int, after: ReviewKey) -> AsyncIterator[bytes]:
+    """Stream the reviews of a user after a given one, as CSV.
+
+    The CSV is produced by Postgres with COPY, the rows are not decoded.
+    """
+    query = get_sql('get_all_user_reviews')
+    chunks = asyncio.Queue(maxsize=MAX_PENDING_CHUNKS)
+
+    async def copy():
+        try:
+            async with get_conn(readonly=True) as conn:
+                await conn.copy_from_query(
+                    query,
+                    account_id,
+                    *after,
+                    # the chunks are bytearrays, StreamingResponse wants bytes
+                    output=lambda chunk: chunks.put(bytes(chunk)),
+                    format='csv',
+                    header=True)
+        except asyncio.CancelledError:
+            # the client went away, nobody reads the queue, which may be full
+            raise
+        except Exception:
+            await chunks.put(None)
+            raise
+        # marks the end of the stream
+        await chunks.put(None)
+
+    copy_task = asyncio.ensure_future(copy())
+    try:
+        while True:
+            chunk = await chunks.get()
+            if chunk is None:
+                break
+            yield chunk
+        # raise the error, if any
+        await copy_task
+    finally:
+        # the client went away
+        copy_task.cancel()
+
+
+async def gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Compress a stream with gzip."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if len(compressed) > 0:
+            yield compressed
+    yield compressor.flush()
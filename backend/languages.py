@@ -0,0 +1,43 @@
+from hashlib import sha256
+import logging
+from typing import Dict, List, Tuple
+
+from asyncpg.connection import Connection
+import orjson
+
+logger = logging.getLogger()
+
+# channel notified by the populate script whenever the language table changes
+LANGUAGE_CHANNEL = 'language_changed'
+
+
+class LanguageCache:
+    """In-process copy of the language table.
+
+    The table changes only when the populate script runs, so it is read once
+    at startup and again every time a notification arrives on
+    LANGUAGE_CHANNEL.
+    The JSON returned by the API is cached too, with an ETag identifying
+    its content.
+    """
+
+    def __init__(self):
+        self.by_iso: Dict[str, Tuple[int, str]] = {}  # ISO -> (id, name)
+        self.by_id: Dict[int, Tuple[str, str]] = {}  # id -> (ISO, name)
+        self.languages: List[dict] = []
+        self.json = b''
+        self.etag = ''
+
+    async def load(self, conn: Connection):
+        res = await conn.fetch(
+            'SELECT id, iso693_3, name FROM language ORDER BY id')
+        self.by_iso = {lng['iso693_3']: (lng['id'], lng['name']) for lng in res}
+        self.by_id = {lng['id']: (lng['iso693_3'], lng['name']) for lng in res}
+        self.languages = [
+            dict(iso693_3=lng['iso693_3'], name=lng['name']) for lng in res]
+        self.json = orjson.dumps(dict(languages=self.languages))
+        self.etag = f'"{sha256(self.json).hexdigest()[:32]}"'
+        logger.debug(f'Loaded {len(res)} languages in the cache')
+
+
+languages = LanguageCache()
@@ -0,0 +1,192 @@
+import asyncio
+from bisect import bisect_left
+from time import perf_counter
+from typing import Callable, Dict, List, Tuple
+
+from fastapi import FastAPI
+from starlette.requests import Request
+from starlette.responses import Response
+
+# seconds, from a fast query to a slow request
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# how often the event loop lag is measured, in seconds
+LOOP_LAG_INTERVAL = 0.5
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind: str
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        registry.append(self)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f'# HELP {self.name} {self.help}',
+            f'# TYPE {self.name} {self.kind}',
+        ] + self.samples()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self):
+        return [
+            f'{self.name}{_labels(self.labels, lv)} {v}'
+            for lv, v in self._values.items()]
+
+
+class Gauge(Metric):
+    """A value read from a function every time the metrics are collected."""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        super().__init__(name, help)
+        self.read = read
+
+    def samples(self):
+        return [f'{self.name} {self.read()}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(
+            self,
+            name: str,
+            help: str,
+            labels: Tuple[str, ...] = (),
+            buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # label values -> (count per bucket and one for +Inf, sum)
+        self._values: Dict[tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values):
+        if label_values not in self._values:
+            self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self._values[label_values]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self):
+        lines = []
+        for lv, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else str(bound)
+                labels = _labels(self.labels, lv, 'le="' + le + '"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, lv)} {total[0]}')
+            lines.append(f'{self.name}_count{_labels(self.labels, lv)} {cumulative}')
+        return lines
+
+
+registry: List[Metric] = []
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Time to process a request',
+    ('route', 'method', 'status'))
+QUERY_DURATION = Histogram(
+    'db_query_duration_seconds',
+    'Time to run a stored query',
+    ('query',))
+ACQUIRE_WAIT = Histogram(
+    'db_pool_acquire_wait_seconds',
+    'Time waited for a connection of the pool')
+ACQUIRE_TIMEOUTS = Counter(
+    'db_pool_acquire_timeouts_total',
+    'Times no connection of the pool was available in time')
+CONNECTION_HOLD = Histogram(
+    'db_pool_connection_hold_seconds',
+    'Time a connection of the pool was kept')
+LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay of the event loop in running a scheduled callback')
+CARDS_DRAWN = Counter(
+    'cards_drawn_total', 'Cards given to the users', ('kind',))
+ANSWERS_REGISTERED = Counter(
+    'answers_registered_total', 'Answers given by the users', ('correct',))
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+async def _monitor_loop_lag():
+    loop = asyncio.get_event_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        LOOP_LAG.observe(max(loop.time() - start - LOOP_LAG_INTERVAL, 0))
+
+
+def attach_metrics(app: FastAPI):
+    """Measure the requests of an app and expose the metrics.
+
+    The metrics are exposed at /metrics in the Prometheus text format.
+    Every process has its own metrics.
+    """
+    # endpoint or mounted app -> route path, used as label
+    route_paths = {}
+    lag_monitor = []
+
+    @app.on_event("startup")
+    async def start_lag_monitor():
+        lag_monitor.append(asyncio.ensure_future(_monitor_loop_lag()))
+
+    @app.on_event("shutdown")
+    async def stop_lag_monitor():
+        for task in lag_monitor:
+            task.cancel()
+
+    @app.middleware("http")
+    async def measure_request(request: Request, call_next):
+        start = perf_counter()
+        response = await call_next(request)
+        if len(route_paths) == 0:
+            for route in app.routes:
+                endpoint = getattr(route, 'endpoint', getattr(route, 'app', None))
+                route_paths[endpoint] = route.path
+        # the router stores in the scope the endpoint it matched
+        route = route_paths.get(request.scope.get('endpoint'), 'unmatched')
+        REQUEST_DURATION.observe(
+            perf_counter() - start,
+            route,
+            request.method,
+            response.status_code)
+        return response
+
+    @app.get("/metrics")
+    async def metrics():
+        return Response(render(), media_type='text/plain; version=0.0.4')
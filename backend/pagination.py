@@ -0,0 +1,26 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from typing import Tuple
+
+import orjson
+
+
+def encode_due_token(next_review: datetime, from_id: int, to_id: int) -> str:
+    """Encode the position of a card in the due queue as an opaque token."""
+    return urlsafe_b64encode(
+        orjson.dumps([next_review, from_id, to_id])).decode()
+
+
+def decode_due_token(token: str) -> Tuple[datetime, int, int]:
+    """Decode a token produced by encode_due_token.
+
+    Raises
+    ------
+    ValueError
+        When the token is malformed
+    """
+    try:
+        next_review, from_id, to_id = orjson.loads(urlsafe_b64decode(token))
+        return datetime.fromisoformat(next_review), int(from_id), int(to_id)
+    except (TypeError, ValueError, orjson.JSONDecodeError) as e:
+        raise ValueError(f'Invalid continuation token: {token}') from e
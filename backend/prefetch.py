@@ -0,0 +1,90 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable, List, Optional, Set, Tuple
+
+from backend.cache import TTLCache
+
+logger = logging.getLogger()
+
+Card = Tuple[int, int]  # (from_id, to_id)
+
+
+def _log_failure(task: asyncio.Future):
+    if not task.cancelled() and task.exception() is not None:
+        logger.error('Could not prefetch a batch', exc_info=task.exception())
+
+
+class _UserBatches:
+    """The batch a user is answering and the prefetched next one."""
+
+    def __init__(self, key: Hashable, cards: List[dict]):
+        self.key = key
+        self.served: Set[Card] = {(c['from_id'], c['to_id']) for c in cards}
+        self.n_answered = 0
+        self.next_batch: Optional[asyncio.Future] = None
+        # answered after the next batch started to be drawn
+        self.answered_since: Set[Card] = set()
+
+
+class BatchPrefetcher:
+    """Draws the next batch of cards of a user while the current one is answered.
+
+    The batch is drawn in background once a given fraction of the current
+    one was answered, excluding the cards in the current one, and kept for
+    a while. The next draw with the same key (e.g. same languages) gets it
+    immediately, without the cards answered in the meantime.
+
+    draw is the coroutine function computing a batch, given the user, the
+    key and the cards to exclude. Its result is returned as is by take,
+    together with the cards answered since the draw started, which the
+    caller should not give again.
+    """
+
+    def __init__(
+            self,
+            draw: Callable[[int, Hashable, Set[Card]], Awaitable],
+            after_fraction: float,
+            ttl: float,
+            max_users: int):
+        self.draw = draw
+        self.after_fraction = after_fraction
+        self._users = TTLCache(max_users, ttl)
+
+    def served(self, account_id: int, key: Hashable, cards: List[dict]):
+        """Record the batch given to a user, dropping any prefetched one."""
+        previous = self._users.pop(account_id)
+        if previous is not None and previous.next_batch is not None:
+            previous.next_batch.cancel()
+        self._users.put(account_id, _UserBatches(key, cards))
+
+    def answered(self, account_id: int, cards: List[Card]):
+        """Record answers, starting the prefetch when enough were given."""
+        batches = self._users.get(account_id)
+        if batches is None:
+            return
+        if batches.next_batch is not None:
+            batches.answered_since.update(cards)
+            return
+        batches.n_answered += sum(card in batches.served for card in cards)
+        if batches.n_answered >= self.after_fraction * len(batches.served):
+            batches.next_batch = asyncio.ensure_future(
+                self.draw(account_id, batches.key, set(batches.served)))
+            batches.next_batch.add_done_callback(_log_failure)
+
+    async def take(self, account_id: int, key: Hashable):
+        """The prefetched batch of a user and the cards answered since.
+
+        Returns None when there's no batch for this key, otherwise a tuple
+        with the result of draw and the cards answered after it started.
+        """
+        batches = self._users.get(account_id)
+        if batches is None or batches.next_batch is None or batches.key != key:
+            return None
+        self._users.pop(account_id)
+        try:
+            # if still running, it's anyway ahead of a new draw
+            result = await batches.next_batch
+        except Exception:
+            # already logged
+            return None
+        return result, batches.answered_since
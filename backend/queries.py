@@ -0,0 +1,105 @@
+import importlib.resources as pkg_resources
+import logging
+import re
+from time import perf_counter
+
+import asyncpg
+
+from backend.metrics import QUERY_DURATION
+import backend.sql
+from backend.sql import get_sql
+
+logger = logging.getLogger()
+
+
+class Query:
+    """A query stored in backend/sql, run as a prepared statement.
+
+    The SQL is passed to the query methods of the connection, which prepare
+    it only the first time and then take it from the statement cache of
+    the connection.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.sql = get_sql(name)
+        self.n_args = max(
+            (int(n) for n in re.findall(r'\$(\d+)', self.sql)), default=0)
+
+    def _check_args(self, args: tuple):
+        if len(args) != self.n_args:
+            raise TypeError(
+                f'Query {self.name} takes {self.n_args} arguments, '
+                f'{len(args)} given')
+
+    async def fetch(self, conn: asyncpg.Connection, *args) -> list:
+        self._check_args(args)
+        start = perf_counter()
+        try:
+            return await conn.fetch(self.sql, *args)
+        finally:
+            QUERY_DURATION.observe(perf_counter() - start, self.name)
+
+    async def fetchrow(self, conn: asyncpg.Connection, *args):
+        self._check_args(args)
+        start = perf_counter()
+        try:
+            return await conn.fetchrow(self.sql, *args)
+        finally:
+            QUERY_DURATION.observe(perf_counter() - start, self.name)
+
+    async def execute(self, conn: asyncpg.Connection, *args):
+        """Run the query ignoring the result."""
+        self._check_args(args)
+        start = perf_counter()
+        try:
+            await conn.execute(self.sql, *args)
+        finally:
+            QUERY_DURATION.observe(perf_counter() - start, self.name)
+
+    async def cursor(self, conn: asyncpg.Connection, *args):
+        """Open a cursor on the query, must be in a transaction."""
+        self._check_args(args)
+        start = perf_counter()
+        try:
+            cursor = conn.cursor(self.sql, *args)
+            # awaiting it opens the cursor
+            return await cursor
+        finally:
+            # only opening the cursor, fetching from it is not measured
+            QUERY_DURATION.observe(perf_counter() - start, self.name)
+
+
+class QueryRegistry:
+    """All the queries in backend/sql, as attributes named like the files.
+
+    For example, queries.draw_new_cards.fetch(conn, ...) runs the prepared
+    statement of draw_new_cards.sql.
+    """
+
+    def __init__(self):
+        self._queries = {
+            name[:-len('.sql')]: Query(name[:-len('.sql')])
+            for name in pkg_resources.contents(backend.sql)
+            if name.endswith('.sql')
+        }
+
+    def __getattr__(self, name: str) -> Query:
+        try:
+            return self._queries[name]
+        except KeyError:
+            raise AttributeError(f'There is no query named {name}')
+
+    async def prepare_all(self, conn: asyncpg.Connection):
+        """Prepare all the queries, it's the init hook of the pool.
+
+        The statements go in the same cache of the connection used by
+        fetch and execute, so the first requests don't have to prepare
+        them.
+        """
+        for query in self._queries.values():
+            # what fetch and execute do before running a query, the
+            # queries cannot be run here without meaningful arguments
+            await conn._get_statement(query.sql, None)
+
+queries = QueryRegistry()
@@ -0,0 +1,23 @@
+import asyncpg
+import orjson
+from starlette.responses import JSONResponse
+
+
+def _default(obj):
+    # orjson calls this for the types it doesn't know
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj.items())
+    raise TypeError(f'Type is not JSON serializable: {type(obj).__name__}')
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson, asyncpg records included.
+
+    FastAPI passes the result of an endpoint through jsonable_encoder
+    before serializing it, unless the endpoint returns a response itself.
+    Endpoints returning many rows return this directly, so the records are
+    serialized in one step, dates and datetimes included.
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=_default)
@@ -0,0 +1,220 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import logging
+from typing import Callable, List, Optional
+
+import asyncpg
+
+from backend.config import Config
+from backend.queries import queries
+
+config = Config()
+
+logger = logging.getLogger()
+
+REVLOG_COLUMNS = [
+    'from_id',
+    'to_id',
+    'account_id',
+    'review_time',
+    'answers',
+    'expected_answers',
+    'correct',
+]
+
+# put in the queue to stop the flusher once the rows before it are written
+_STOP = object()
+
+# the DB could not be reached, the rows can be written later
+_CONNECTION_ERRORS = (
+    OSError,
+    asyncio.TimeoutError,
+    asyncpg.exceptions.PostgresConnectionError,
+)
+
+
+class RevlogBuffer:
+    """Bounded in-process queue of revlog rows, written to the DB in batches.
+
+    A background task copies the rows to the revlog table when there are
+    flush_rows of them or the oldest one waited flush_interval seconds,
+    whatever comes first. So, in case of a crash, the answers of the last
+    flush_interval seconds can be lost.
+    When the queue is full adding rows waits for a flush.
+    When the DB cannot be reached the rows are kept, up to max_rows of
+    them, and written with the next flush. They are dropped only if the
+    last flush, on stop, fails too.
+    """
+
+    def __init__(self, max_rows: int, flush_rows: int, flush_interval: float):
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        # rows of a flush which could not reach the DB
+        self._failed: list = []
+        self._last_review_time = datetime.min.replace(tzinfo=timezone.utc)
+
+    def _review_time(self) -> datetime:
+        # strictly increasing, so repeated answers to a card keep unique keys
+        review_time = max(
+            datetime.now(timezone.utc),
+            self._last_review_time + timedelta(microseconds=1))
+        self._last_review_time = review_time
+        return review_time
+
+    async def add(
+            self,
+            from_id: int,
+            to_id: int,
+            account_id: int,
+            answers: List[str],
+            expected_answers: List[str],
+            correct: bool):
+        """Queue a revlog row, the review time is the current one."""
+        await self._queue.put((
+            from_id,
+            to_id,
+            account_id,
+            self._review_time(),
+            answers,
+            expected_answers,
+            correct,
+        ))
+
+    def start(self, get_conn: Callable):
+        """Start writing the queued rows using connections from get_conn."""
+        # created here to be bound to the loop of the app
+        self._queue = asyncio.Queue(maxsize=self.max_rows)
+        self._stopping = asyncio.Event()
+        self._flusher = asyncio.ensure_future(self._flush_loop(get_conn))
+
+    async def stop(self):
+        """Write all the queued rows and stop."""
+        self._stopping.set()
+        await self._queue.put(_STOP)
+        await self._flusher
+
+    async def _flush_loop(self, get_conn: Callable):
+        loop = asyncio.get_event_loop()
+        stopping = False
+        while not stopping:
+            batch, self._failed = self._failed, []
+            if len(batch) == 0:
+                batch.append(await self._queue.get())
+            deadline = loop.time() + self.flush_interval
+            # no more rows after _STOP, don't wait for them
+            while len(batch) < self.flush_rows and batch[-1] is not _STOP:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            if self._stopping.is_set():
+                # the last flush, with all the rows left
+                while batch[-1] is not _STOP:
+                    batch.append(await self._queue.get())
+            if batch[-1] is _STOP:
+                stopping = True
+                batch.pop()
+            if len(batch) == 0:
+                continue
+            try:
+                unwritten = await self._write(get_conn, batch)
+            except Exception:
+                logger.exception(f'{len(batch)} revlog rows lost')
+                continue
+            if len(unwritten) == 0:
+                continue
+            if stopping:
+                logger.error(
+                    f'{len(unwritten)} revlog rows lost, the DB cannot be reached')
+                continue
+            if len(unwritten) > self.max_rows:
+                logger.error(
+                    f'{len(unwritten) - self.max_rows} revlog rows lost, '
+                    'too many waiting for the DB')
+            self._failed = unwritten[-self.max_rows:]
+            # give the DB some time before trying again, unless stopping
+            try:
+                await asyncio.wait_for(
+                    self._stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _write(self, get_conn: Callable, batch: list) -> list:
+        """Write the rows, returns those to try again later."""
+        try:
+            async with get_conn() as conn:
+                async with conn.transaction():
+                    await conn.copy_records_to_table(
+                        'revlog', records=batch, columns=REVLOG_COLUMNS)
+                    await _add_daily_stats(conn, batch)
+            logger.debug(f'Flushed {len(batch)} revlog rows')
+            return []
+        except _CONNECTION_ERRORS:
+            logger.exception(f'Could not write {len(batch)} revlog rows, keeping them')
+            return batch
+        except Exception:
+            # a single bad row (e.g. a card deleted in the meantime) makes the
+            # whole copy fail, so try the rows one by one
+            logger.exception('Could not copy the revlog rows, inserting them one by one')
+            return await self._write_one_by_one(get_conn, batch)
+
+    async def _write_one_by_one(self, get_conn: Callable, batch: list) -> list:
+        done = 0
+        try:
+            async with get_conn() as conn:
+                for row in batch:
+                    try:
+                        async with conn.transaction():
+                            await conn.execute(
+                                f"""
+                                INSERT INTO revlog ({', '.join(REVLOG_COLUMNS)})
+                                VALUES ($1, $2, $3, $4, $5, $6, $7)
+                                """,
+                                *row)
+                            await _add_daily_stats(conn, [row])
+                    except _CONNECTION_ERRORS:
+                        raise
+                    except Exception:
+                        logger.exception(f'Revlog row lost: {row}')
+                    done += 1
+        except _CONNECTION_ERRORS:
+            logger.exception(
+                f'Could not write {len(batch) - done} revlog rows, keeping them')
+            return batch[done:]
+        return []
+
+
+async def _add_daily_stats(conn, rows: list):
+    """Add the given revlog rows to the daily stats."""
+    stats = Counter()  # (account, day, correct) -> count
+    for row in rows:
+        account_id, review_time, correct = row[2], row[3], row[6]
+        stats[(account_id, review_time.date(), correct)] += 1
+    days = sorted(set((account_id, day) for account_id, day, _ in stats))
+    await queries.add_revlog_daily.execute(
+        conn,
+        [account_id for account_id, _ in days],
+        [day for _, day in days],
+        [stats[(account_id, day, True)] for account_id, day in days],
+        [stats[(account_id, day, True)] + stats[(account_id, day, False)]
+         for account_id, day in days],
+    )
+
+
+if config.revlog_write_behind:
+    revlog_buffer = RevlogBuffer(
+        config.revlog_buffer_max_rows,
+        config.revlog_flush_rows,
+        config.revlog_flush_interval,
+    )
+else:
+    revlog_buffer = None
@@ -0,0 +1,251 @@
+"""Spaced repetition algorithms deciding when a card is shown again.
+
+Every scheduler works on batches: the state of the cards is a dictionary
+of NumPy arrays, one element per card, and the answers are arrays too.
+A missing value (NaN) in the fields used by a scheduler means the card was
+never reviewed with it. Fields used by other schedulers are passed through
+unchanged, so switching algorithm does not lose the previous state.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, Tuple
+
+import numpy as np
+
+# all the fields stored for a card, the DB columns of card_user_state
+STATE_FIELDS = ('i_factor', 'ef_factor', 'stability', 'difficulty')
+
+CardStates = Dict[str, np.ndarray]
+
+
+def new_states(n: int) -> CardStates:
+    """The state of n cards never reviewed."""
+    return {field: np.full(n, np.nan) for field in STATE_FIELDS}
+
+
+def _round(x: np.ndarray) -> np.ndarray:
+    # like round(double precision) in Postgres, which the SQL version used:
+    # halves go to the even integer (only round(numeric) goes away from zero)
+    return np.rint(x)
+
+
+class Scheduler(ABC):
+    name: str
+
+    @abstractmethod
+    def review(
+            self,
+            states: CardStates,
+            correct: np.ndarray,
+            elapsed_days: np.ndarray,
+            ) -> Tuple[CardStates, np.ndarray]:
+        """Update the state of a batch of cards after an answer.
+
+        Parameters
+        ----------
+        states: CardStates
+            The current state of the cards
+        correct: np.ndarray
+            Whether each answer was correct
+        elapsed_days: np.ndarray
+            Days since the previous review of each card, ignored for new cards
+
+        Returns
+        -------
+        Tuple[CardStates, np.ndarray]
+            The new state of the cards and in how many days each is due
+        """
+
+
+class SM2(Scheduler):
+    """The SM-2 variant used historically by the app.
+
+    A correct answer is roughly equivalent to "Easy" in Anki:
+    EF = EF + 0.15 (2.65 for a new card), the card is shown again after I
+    days, with I = 1 for a new card, 6 the second time and I * EF afterwards.
+    A wrong answer is roughly equivalent to "Again": EF is kept (2.3 for a
+    new card) and the card is shown again the next day.
+
+    The arithmetic is done in single precision, like the REAL column
+    storing EF, so the results are the same the SQL version gave.
+    """
+    name = 'sm2'
+
+    def review(self, states, correct, elapsed_days):
+        i_factor = states['i_factor']
+        ef_factor = states['ef_factor'].astype(np.float32)
+        new = np.isnan(i_factor)
+        correct = np.asarray(correct, dtype=bool)
+
+        # the due date uses the interval before the update
+        due_days = np.where(correct & ~new, _round(i_factor), 1.0)
+        next_i = np.where(
+            i_factor == 1,
+            6.0,
+            _round((i_factor.astype(np.float32) * ef_factor).astype(np.float64)))
+        next_i = np.where(correct & ~new, next_i, 1.0)
+        next_ef = np.where(
+            correct,
+            np.maximum(np.float32(1.3), ef_factor + np.float32(0.15)),
+            np.maximum(np.float32(1.3), ef_factor))
+        next_ef = np.where(
+            new, np.where(correct, np.float32(2.65), np.float32(2.3)), next_ef)
+
+        updated = dict(states)
+        updated['i_factor'] = next_i
+        updated['ef_factor'] = next_ef.astype(np.float64)
+        return updated, due_days
+
+
+class FSRS(Scheduler):
+    """Free Spaced Repetition Scheduler, version 4.5.
+
+    A correct answer is graded as "Good" and a wrong one as "Again".
+    The card is due when the probability of recalling it falls to the
+    desired retention.
+    """
+    name = 'fsrs'
+
+    # default parameters of FSRS 4.5
+    DEFAULT_WEIGHTS = (
+        0.4872, 1.4003, 3.7145, 13.8206, 5.1618, 1.2298, 0.8975, 0.031,
+        1.6474, 0.1367, 1.0461, 2.1072, 0.0793, 0.3246, 1.587, 0.2272, 2.8755,
+    )
+    DECAY = -0.5
+    FACTOR = 0.9 ** (1 / DECAY) - 1
+    AGAIN = 1
+    GOOD = 3
+
+    def __init__(
+            self,
+            weights: Tuple[float, ...] = DEFAULT_WEIGHTS,
+            desired_retention: float = 0.9,
+            max_interval: float = 36500):
+        self.w = weights
+        self.desired_retention = desired_retention
+        self.max_interval = max_interval
+
+    def _initial_difficulty(self, grade):
+        return self.w[4] - (grade - 3) * self.w[5]
+
+    def retrievability(self, stability, elapsed_days):
+        """Probability of recalling a card after some days."""
+        return (1 + self.FACTOR * elapsed_days / stability) ** self.DECAY
+
+    def review(self, states, correct, elapsed_days):
+        w = self.w
+        stability = states['stability']
+        difficulty = states['difficulty']
+        new = np.isnan(stability)
+        correct = np.asarray(correct, dtype=bool)
+        grade = np.where(correct, self.GOOD, self.AGAIN)
+        # NaN for new cards would only produce warnings, they're replaced below
+        stability = np.where(new, 1.0, stability)
+        difficulty = np.where(new, 1.0, difficulty)
+        elapsed_days = np.maximum(np.asarray(elapsed_days, dtype=np.float64), 0)
+
+        r = self.retrievability(stability, elapsed_days)
+        recall_stability = stability * (
+            np.exp(w[8])
+            * (11 - difficulty)
+            * stability ** -w[9]
+            * (np.exp(w[10] * (1 - r)) - 1)
+            + 1)
+        forget_stability = (
+            w[11]
+            * difficulty ** -w[12]
+            * ((stability + 1) ** w[13] - 1)
+            * np.exp(w[14] * (1 - r)))
+        next_stability = np.where(correct, recall_stability, forget_stability)
+        next_stability = np.where(new, np.take(w, grade - 1), next_stability)
+
+        next_difficulty = difficulty - w[6] * (grade - 3)
+        next_difficulty = (
+            w[7] * self._initial_difficulty(3)
+            + (1 - w[7]) * next_difficulty)
+        next_difficulty = np.where(
+            new, self._initial_difficulty(grade), next_difficulty)
+        next_difficulty = np.clip(next_difficulty, 1, 10)
+
+        due_days = next_stability / self.FACTOR * (
+            self.desired_retention ** (1 / self.DECAY) - 1)
+        due_days = np.clip(_round(due_days), 1, self.max_interval)
+
+        updated = dict(states)
+        updated['stability'] = next_stability
+        updated['difficulty'] = next_difficulty
+        return updated, due_days
+
+
+SCHEDULERS = {s.name: s for s in (SM2, FSRS)}
+
+
+def get_scheduler(name: str) -> Scheduler:
+    """Instantiate a scheduler by name.
+
+    Raises
+    ------
+    ValueError
+        When there's no scheduler with that name
+    """
+    if name not in SCHEDULERS:
+        raise ValueError(
+            f'Unknown scheduler {name}, available ones are {sorted(SCHEDULERS)}')
+    return SCHEDULERS[name]()
+
+
+def replay(
+        scheduler: Scheduler,
+        card_idx: np.ndarray,
+        review_days: np.ndarray,
+        correct: np.ndarray,
+        ) -> Tuple[CardStates, np.ndarray]:
+    """Simulate a whole review history with a scheduler.
+
+    The reviews must be sorted by card and then by time. All the first
+    reviews of the cards are processed as one batch, then all the second
+    ones and so on, so the number of batches is the number of reviews of
+    the most reviewed card.
+
+    Parameters
+    ----------
+    scheduler: Scheduler
+        The algorithm to use
+    card_idx: np.ndarray
+        For each review, the index of the card, from 0 to the number of cards
+    review_days: np.ndarray
+        The time of each review, in days from any fixed point
+    correct: np.ndarray
+        Whether each answer was correct
+
+    Returns
+    -------
+    Tuple[CardStates, np.ndarray]
+        The final state of each card and, for each review, in how many days
+        the scheduler would show the card again
+    """
+    n_reviews = len(card_idx)
+    due_days = np.empty(n_reviews)
+    if n_reviews == 0:
+        return new_states(0), due_days
+    n_cards = int(card_idx.max()) + 1
+    states = new_states(n_cards)
+    last_review = np.zeros(n_cards)
+
+    # position of each review in the history of its card
+    first = np.ones(n_reviews, dtype=bool)
+    first[1:] = card_idx[1:] != card_idx[:-1]
+    first_pos = np.maximum.accumulate(np.where(first, np.arange(n_reviews), 0))
+    rank = np.arange(n_reviews) - first_pos
+
+    for k in range(int(rank.max()) + 1):
+        reviews = np.flatnonzero(rank == k)
+        cards = card_idx[reviews]
+        batch = {field: values[cards] for field, values in states.items()}
+        batch, due_days[reviews] = scheduler.review(
+            batch,
+            correct[reviews],
+            review_days[reviews] - last_review[cards])
+        for field, values in batch.items():
+            states[field][cards] = values
+        last_review[cards] = review_days[reviews]
+    return states, due_days
@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+from csv import writer
+import logging
+import sys
+from time import perf_counter
+
+import asyncpg
+import numpy as np
+
+from backend.config import Config
+from backend.scheduler import SCHEDULERS, get_scheduler, replay
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s: %(message)s',
+)
+
+logger = logging.getLogger(__name__)
+
+# answers to a card closer than this to the previous one are considered
+# repetitions in the same session, which do not affect the schedule
+REPETITION_DAYS = 1 / 24
+
+
+async def load_reviews(account_id: int):
+    """Load the review history of a user sorted by card and time."""
+    conn = await asyncpg.connect(dsn=Config().pg_conn_str)
+    try:
+        rows = await conn.fetch(
+            """
+            SELECT
+                from_id,
+                to_id,
+                EXTRACT(EPOCH FROM review_time) / 86400 AS review_day,
+                correct
+            FROM revlog
+            WHERE
+                account_id = $1
+            ORDER BY
+                from_id,
+                to_id,
+                review_time
+            """,
+            account_id)
+    finally:
+        await conn.close()
+    ids = np.array([(r['from_id'], r['to_id']) for r in rows], dtype=np.int64)
+    review_days = np.array([r['review_day'] for r in rows], dtype=np.float64)
+    correct = np.array([r['correct'] for r in rows], dtype=bool)
+    return ids.reshape(-1, 2), review_days, correct
+
+
+def main(account_id: int, scheduler_name: str):
+    scheduler = get_scheduler(scheduler_name)
+    ids, review_days, correct = asyncio.get_event_loop().run_until_complete(
+        load_reviews(account_id))
+    logger.info(f'Loaded {len(ids)} reviews')
+
+    _, card_idx = np.unique(ids, axis=0, return_inverse=True)
+    card_idx = card_idx.reshape(-1)
+    keep = np.ones(len(ids), dtype=bool)
+    keep[1:] = (
+        (card_idx[1:] != card_idx[:-1])
+        | (review_days[1:] - review_days[:-1] >= REPETITION_DAYS))
+    logger.info(f'Ignoring {np.count_nonzero(~keep)} repetitions')
+
+    start = perf_counter()
+    _, due_days = replay(
+        scheduler, card_idx[keep], review_days[keep], correct[keep])
+    elapsed = perf_counter() - start
+    logger.info(
+        f'Replayed {np.count_nonzero(keep)} reviews with {scheduler.name} '
+        f'in {elapsed:.3f} seconds')
+
+    out = writer(sys.stdout)
+    out.writerow(['from_id', 'to_id', 'review_day', 'correct', 'due_days'])
+    for (from_id, to_id), day, ok, due in zip(
+            ids[keep], review_days[keep], correct[keep], due_days):
+        out.writerow([from_id, to_id, day, ok, due])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay the review history of a user with a scheduler, '
+                    'writing as CSV when each review would make the card due')
+    parser.add_argument('account_id', help='the user to simulate', type=int)
+    parser.add_argument(
+        '--scheduler', choices=sorted(SCHEDULERS), default='sm2')
+    args = parser.parse_args()
+    main(args.account_id, args.scheduler)
@@ -0,0 +1,14 @@
+from functools import lru_cache
+import importlib.resources as pkg_resources
+
+
+@lru_cache()
+def get_sql(query_name: str) -> str:
+    """Read the content of a stored query as a string.
+
+    SQL comments are stripped.
+    """
+    query = pkg_resources.read_text(
+        __name__, f'{query_name}.sql').split('\n')
+    query = [line for line in query if not line.startswith('--')]
+    return '\n'.join(query)
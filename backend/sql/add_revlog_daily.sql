@@ -0,0 +1,23 @@
+-- adds to the daily stats of some users ($1) for some days ($2) the
+-- given number of correct ($3) and total ($4) answers
+-- the anonymous user (1) is skipped, its stats are never shown and would all
+-- be on the same row
+INSERT INTO revlog_daily AS rd (
+    account_id,
+    day,
+    correct,
+    total
+    )
+SELECT
+    *
+FROM unnest(
+    $1 :: INTEGER[],
+    $2 :: DATE[],
+    $3 :: INTEGER[],
+    $4 :: INTEGER[]
+    ) AS s(account_id, day, correct, total)
+WHERE
+    account_id <> 1
+ON CONFLICT (account_id, day) DO UPDATE SET
+    correct = rd.correct + EXCLUDED.correct,
+    total   = rd.total + EXCLUDED.total
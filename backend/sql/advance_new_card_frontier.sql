@@ -0,0 +1,27 @@
+-- moves forward the frontiers of a user ($1) for a target language ($2)
+-- given the source languages ($3), the starting point for each ($4) and
+-- the first unseen card on each side of it ($5, $6), which can be NULL
+INSERT INTO new_card_frontier AS f (
+    account_id,
+    from_lang,
+    to_lang,
+    start_seq,
+    after_start_seq,
+    before_start_seq
+    )
+SELECT
+    $1,
+    fr.from_lang,
+    $2,
+    fr.start_seq,
+    fr.after_start_seq,
+    fr.before_start_seq
+FROM unnest(
+    $3 :: SMALLINT[],
+    $4 :: BIGINT[],
+    $5 :: BIGINT[],
+    $6 :: BIGINT[]
+    ) AS fr(from_lang, start_seq, after_start_seq, before_start_seq)
+ON CONFLICT (account_id, from_lang, to_lang) DO UPDATE SET
+    after_start_seq  = GREATEST(f.after_start_seq, EXCLUDED.after_start_seq),
+    before_start_seq = GREATEST(f.before_start_seq, EXCLUDED.before_start_seq)
@@ -1,4 +1,14 @@
--- retrieves up to 20 cards never seen by a given user and source/target language
+-- retrieves up to $4 cards never seen by a given user ($3) for a target ($1)
+-- and list of source ($2) languages
+-- the cards are drawn in seq order, which is random, starting from a
+-- different point for every user ($5 is its position as a fraction of the
+-- sequence): first the cards after it, including the ones added later, then
+-- the ones before it
+-- only the cards after the frontiers of the user are scanned, the ones
+-- before were all seen already
+-- a source language without cards to draw gives a row with only from_lang,
+-- start_seq and max_seq, the highest seq of its cards, so its frontiers can
+-- be moved past the end; these rows come last
 SELECT
     fl.name        AS from_language,
     tl.name        AS to_language,
@@ -8,24 +18,98 @@ SELECT
     c.to_id        AS to_id,
     c.from_txt     AS from_text,
     c.to_tokens    AS to_tokens,
-    c.original_txt AS to_text
+    c.original_txt AS to_text,
+    fl.id          AS from_lang,
+    c.seq          AS seq,
+    c.wrapped      AS wrapped,
+    st.start_seq   AS start_seq,
+    st.max_seq     AS max_seq
 FROM
-    card c
-        JOIN language fl
-              ON fl.id = c.from_lang
+    language fl
         JOIN language tl
-              ON tl.id = c.to_lang
-        LEFT JOIN card_user_state cus
-                  ON c.from_id = cus.from_id
-                      AND c.to_id = cus.to_id
-                      AND cus.account_id = $3
-        LEFT JOIN card_trouble tro
-                  ON c.from_id = tro.from_id
-                      AND c.to_id = tro.to_id
-                      AND tro.account_id = $3
+              ON tl.iso693_3 = $1
+        LEFT JOIN new_card_frontier f
+                  ON f.account_id = $3
+                      AND f.from_lang = fl.id
+                      AND f.to_lang = tl.id
+        CROSS JOIN LATERAL (
+            SELECT
+                COALESCE(
+                    f.start_seq,
+                    floor($5 :: DOUBLE PRECISION * (SELECT last_value FROM card_seq)) :: BIGINT
+                ) AS start_seq,
+                (
+                    SELECT max(mc.seq)
+                    FROM card mc
+                    WHERE
+                          mc.from_lang = fl.id
+                      AND mc.to_lang = tl.id
+                ) AS max_seq
+        ) st
+        LEFT JOIN LATERAL (
+            (
+                SELECT
+                    c.*,
+                    FALSE AS wrapped
+                FROM
+                    card c
+                WHERE
+                      c.from_lang = fl.id
+                  AND c.to_lang = tl.id
+                  -- GREATEST ignores the NULL of a missing frontier
+                  AND c.seq >= GREATEST(st.start_seq, f.after_start_seq)
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM card_user_state cus
+                      WHERE
+                            c.from_id = cus.from_id
+                        AND c.to_id = cus.to_id
+                        AND cus.account_id = $3)
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM card_trouble tro
+                      WHERE
+                            c.from_id = tro.from_id
+                        AND c.to_id = tro.to_id
+                        AND tro.account_id = $3)
+                ORDER BY c.seq
+                LIMIT $4
+            )
+            UNION ALL
+            (
+                SELECT
+                    c.*,
+                    TRUE AS wrapped
+                FROM
+                    card c
+                WHERE
+                      c.from_lang = fl.id
+                  AND c.to_lang = tl.id
+                  AND c.seq >= COALESCE(f.before_start_seq, 0)
+                  AND c.seq < st.start_seq
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM card_user_state cus
+                      WHERE
+                            c.from_id = cus.from_id
+                        AND c.to_id = cus.to_id
+                        AND cus.account_id = $3)
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM card_trouble tro
+                      WHERE
+                            c.from_id = tro.from_id
+                        AND c.to_id = tro.to_id
+                        AND tro.account_id = $3)
+                ORDER BY c.seq
+                LIMIT $4
+            )
+            ORDER BY wrapped, seq
+            LIMIT $4
+        ) c ON TRUE
 WHERE
       fl.iso693_3 = ANY ($2)
-  AND tl.iso693_3 = $1
-  AND cus.account_id IS NULL
-  AND tro.account_id IS NULL
-LIMIT 20
+ORDER BY
+    c.wrapped,
+    c.seq
+LIMIT $4
@@ -1,3 +1,6 @@
+-- retrieves the reviews of a user ($1) done after the review with a given
+-- time ($2) and card ids ($3, $4), in chronological order, so an interrupted
+-- download can be resumed; reviews can share the time, the ids break the ties
 SELECT
   rl.from_id,
   rl.to_id,
@@ -12,4 +15,9 @@ FROM revlog rl
     ON c.from_id = rl.from_id
       AND c.to_id = rl.to_id
 WHERE
-    account_id = $1
+    rl.account_id = $1
+    AND (rl.review_time, rl.from_id, rl.to_id) > ($2, $3, $4)
+ORDER BY
+    rl.review_time,
+    rl.from_id,
+    rl.to_id
@@ -0,0 +1,20 @@
+-- retrieves the scheduling state of some cards ($2, $3) of a user ($1)
+-- the cards never reviewed are not returned
+-- the rows are locked, concurrent answers to the same card wait
+SELECT
+    cus.from_id,
+    cus.to_id,
+    cus.i_factor,
+    cus.ef_factor,
+    cus.stability,
+    cus.difficulty,
+    EXTRACT(EPOCH FROM current_timestamp - cus.last_review) / 86400 AS elapsed_days
+FROM
+    card_user_state cus
+WHERE
+      cus.account_id = $1
+  AND (cus.from_id, cus.to_id) IN (
+      SELECT
+          *
+      FROM unnest($2 :: INTEGER[], $3 :: INTEGER[]))
+FOR UPDATE
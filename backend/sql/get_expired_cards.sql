@@ -1,9 +1,12 @@
--- retrieves cards for a given user and source/target language
--- there are up to 20 cards never seen by the user
--- and all the cards seen in the past an now expired
+-- retrieves a page of the cards seen in the past by a given user and now
+-- expired, for a target language ($2) and a list of source languages ($3)
+-- the most overdue cards come first, the page starts after the card
+-- with the given next review time ($4) and ids ($5, $6) and has up to $7 cards
+-- the languages are filtered on the user state, so the due queue index
+-- is used before joining with the (much bigger) card table
 SELECT
-    c.from_lang,
-    c.to_lang,
+    cus.from_lang,
+    cus.next_review,
     c.from_id        AS from_id,
     c.to_id          AS to_id,
     c.from_txt       AS from_text,
@@ -12,8 +15,8 @@ SELECT
     cn.hint          AS hint,
     cn.explanation   AS explanation
 FROM
-    card c
-        JOIN card_user_state cus
+    card_user_state cus
+        JOIN card c
              ON c.from_id = cus.from_id
             AND c.to_id = cus.to_id
         LEFT JOIN card_note cn
@@ -23,4 +26,12 @@ FROM
 
 WHERE
       cus.account_id = $1
+  AND cus.to_lang = $2
+  AND cus.from_lang = ANY ($3)
   AND cus.next_review < current_timestamp
+  AND (cus.next_review, cus.from_id, cus.to_id) > ($4, $5, $6)
+ORDER BY
+    cus.next_review,
+    cus.from_id,
+    cus.to_id
+LIMIT $7
@@ -1,9 +1,9 @@
 SELECT
-    substr(date_trunc('day', rl.review_time) :: TEXT, 1, 10)   AS day,
-    SUM(CASE WHEN rl.correct THEN 1 ELSE 0 END) AS correct,
-    count(1)                                    AS total
-FROM revlog rl
+    day :: TEXT AS day,
+    correct,
+    total
+FROM revlog_daily
 WHERE
     account_id = $1
-GROUP BY
-    date_trunc('day', rl.review_time)
+ORDER BY
+    day
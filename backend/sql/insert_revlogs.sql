@@ -0,0 +1,56 @@
+-- inserts the answers of a user ($1) in the order they were given
+-- every answer is one microsecond after the previous one, so the review
+-- times stay unique even when a card is repeated
+-- the daily stats of the user are updated as well, except for the anonymous
+-- user (1), whose stats are never shown and would all be on the same row
+WITH inserted AS (
+    INSERT INTO revlog (
+                  from_id,
+                  to_id,
+                  account_id,
+                  review_time,
+                  answers,
+                  expected_answers,
+                  correct
+                  )
+    SELECT
+        a.from_id,
+        a.to_id,
+        $1,
+        current_timestamp + (a.idx - 1) * '1 microsecond' :: INTERVAL,
+        -- there are no arrays of arrays, the answers are passed as JSON
+        ARRAY(SELECT json_array_elements_text(a.answers)),
+        ARRAY(SELECT json_array_elements_text(a.expected_answers)),
+        a.correct
+    FROM unnest(
+        $2 :: INTEGER[],
+        $3 :: INTEGER[],
+        $4 :: JSON[],
+        $5 :: JSON[],
+        $6 :: BOOLEAN[]
+        ) WITH ORDINALITY AS a(from_id, to_id, answers, expected_answers, correct, idx)
+    RETURNING
+        account_id,
+        review_time,
+        correct
+)
+INSERT INTO revlog_daily AS rd (
+    account_id,
+    day,
+    correct,
+    total
+    )
+SELECT
+    account_id,
+    (review_time AT TIME ZONE 'UTC') :: DATE,
+    count(1) FILTER (WHERE correct),
+    count(1)
+FROM inserted
+WHERE
+    account_id <> 1
+GROUP BY
+    account_id,
+    (review_time AT TIME ZONE 'UTC') :: DATE
+ON CONFLICT (account_id, day) DO UPDATE SET
+    correct = rd.correct + EXCLUDED.correct,
+    total   = rd.total + EXCLUDED.total
@@ -0,0 +1,48 @@
+-- stores the scheduling state of some cards ($2, $3) of a user ($1)
+-- after a review, given the days until they are due ($4) and the new
+-- values of the scheduler fields ($5 to $8)
+INSERT INTO card_user_state AS cus (
+    from_id,
+    to_id,
+    account_id,
+    from_lang,
+    to_lang,
+    next_review,
+    last_review,
+    i_factor,
+    ef_factor,
+    stability,
+    difficulty
+    )
+SELECT
+    c.from_id,
+    c.to_id,
+    $1,
+    c.from_lang,
+    c.to_lang,
+    current_timestamp + s.due_days * '1 day' :: INTERVAL,
+    current_timestamp,
+    s.i_factor,
+    s.ef_factor,
+    s.stability,
+    s.difficulty
+FROM
+    unnest(
+        $2 :: INTEGER[],
+        $3 :: INTEGER[],
+        $4 :: DOUBLE PRECISION[],
+        $5 :: SMALLINT[],
+        $6 :: REAL[],
+        $7 :: REAL[],
+        $8 :: REAL[]
+        ) AS s(from_id, to_id, due_days, i_factor, ef_factor, stability, difficulty)
+        JOIN card c
+             ON c.from_id = s.from_id
+            AND c.to_id = s.to_id
+ON CONFLICT (from_id, to_id, account_id) DO UPDATE SET
+    next_review = EXCLUDED.next_review,
+    last_review = EXCLUDED.last_review,
+    i_factor    = EXCLUDED.i_factor,
+    ef_factor   = EXCLUDED.ef_factor,
+    stability   = EXCLUDED.stability,
+    difficulty  = EXCLUDED.difficulty
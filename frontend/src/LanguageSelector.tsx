@@ -15,13 +15,17 @@ function LanguageSelector(props: Props) {
 
   useEffect(() => {
     async function loadLanguageList() {
-        const langs = (await axios.get('/languages')).data
-        setLanguages(langs.languages)
+        // the list is cached by the browser, the selection is per user
+        const [langs, latest] = await Promise.all([
+          axios.get('/languages'),
+          axios.get('/selected_languages'),
+        ])
+        setLanguages(langs.data.languages)
         // if the user is logged in, retrieve their latest languages
         // and initialize the form to them
-        if (langs.selected) {
-          setSrcLangs(langs.selected.src_langs)
-          setTgtLang(langs.selected.tgt_lang)
+        if (latest.data.selected) {
+          setSrcLangs(latest.data.selected.src_langs)
+          setTgtLang(latest.data.selected.tgt_lang)
         }
     }
     loadLanguageList()
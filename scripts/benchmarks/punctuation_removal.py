@@ -0,0 +1,98 @@
+"""Compare the ways to remove the punctuation from the tokens.
+
+The translation table with every punctuation code point of the Unicode,
+built at import as generate.py used to do, against the range table of
+punctuation.py, filled when used, and a regex character class made from
+the same ranges. The import time is measured in a new interpreter, the
+throughput on tokens of a sentence file. Run from the repository root with
+
+    python scripts/benchmarks/punctuation_removal.py path/to/sentences.csv
+"""
+import argparse
+from csv import reader
+from pathlib import Path
+import re
+import subprocess
+import sys
+from timeit import repeat
+
+GENERATE_CARDS = Path(__file__).parent.parent / 'generate_cards'
+sys.path.insert(0, str(GENERATE_CARDS))
+
+from punctuation import PUNCT_RANGES, PunctuationTable  # noqa: E402
+
+FULL_TABLE = '''
+from sys import maxunicode
+from unicodedata import category
+PUNCT_TRANSL = dict.fromkeys(
+    i for i in range(maxunicode)
+    if category(chr(i)).startswith('P')
+    )
+'''
+
+RANGE_TABLE = f'''
+import sys
+sys.path.insert(0, {str(GENERATE_CARDS)!r})
+from punctuation import PUNCT_TRANSL
+'''
+
+
+def import_time(code: str, repetitions: int = 5) -> float:
+    """Best time to run some code in a new interpreter, minus the startup."""
+    def best(code):
+        return min(
+            repeat(
+                lambda: subprocess.run([sys.executable, '-c', code], check=True),
+                number=1,
+                repeat=repetitions))
+    return best(code) - best('pass')
+
+
+def read_tokens(sentence_file: str, n_sentences: int):
+    tokens = []
+    for idx, [_, _, text] in enumerate(reader(open(sentence_file), delimiter='\t')):
+        if idx == n_sentences:
+            break
+        # a rough tokenization is enough, the punctuation stays attached
+        for word in text.split(' '):
+            tokens.extend((word, ' '))
+    return tokens
+
+
+def main(sentence_file: str, n_sentences: int):
+    print(f'import, full table: {import_time(FULL_TABLE) * 1000:.1f} ms')
+    print(f'import, range table: {import_time(RANGE_TABLE) * 1000:.1f} ms')
+
+    namespace = {}
+    exec(FULL_TABLE, namespace)
+    full_table = namespace['PUNCT_TRANSL']
+    range_table = PunctuationTable(PUNCT_RANGES)
+    regex = re.compile('[' + ''.join(
+        f'{re.escape(chr(start))}-{re.escape(chr(end))}'
+        for start, end in PUNCT_RANGES) + ']+')
+    tokens = read_tokens(sentence_file, n_sentences)
+    expected = [token.translate(full_table) for token in tokens]
+    candidates = dict(
+        full_table=lambda token: token.translate(full_table),
+        range_table=lambda token: token.translate(range_table),
+        regex=lambda token: regex.sub('', token),
+    )
+    for name, strip in candidates.items():
+        assert [strip(token) for token in tokens] == expected, name
+        best = min(repeat(
+            lambda: [strip(token) for token in tokens], number=1, repeat=5))
+        print(f'{name}: {len(tokens) / best / 1e6:.2f} M tokens/s')
+    print(f'entries, full table: {len(full_table)}, range table: '
+          f'{len(range_table)} filled, {len(PUNCT_RANGES)} ranges')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('sentences', help='the sentence CSV file', type=str)
+    parser.add_argument(
+        '--sentences-count',
+        help='how many sentences to read the tokens from',
+        type=int,
+        default=100_000)
+    args = parser.parse_args()
+    main(args.sentences, args.sentences_count)
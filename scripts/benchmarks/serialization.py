@@ -0,0 +1,56 @@
+"""Compare the serialization of the API responses.
+
+FastAPI's default path (jsonable_encoder, then json.dumps in JSONResponse)
+against ORJSONResponse, on payloads shaped like the ones of /draw_cards
+and /my_revision_stats. Run from the repository root with
+
+    PYTHONPATH=. python scripts/benchmarks/serialization.py
+"""
+from datetime import date, timedelta
+from timeit import repeat
+
+from fastapi.encoders import jsonable_encoder
+from starlette.responses import JSONResponse
+
+from backend.responses import ORJSONResponse
+
+
+def draw_payload(n_cards: int = 20):
+    return [
+        dict(
+            from_id=1000 + i,
+            to_id=2000 + i,
+            from_txt='This is a sentence in the source language.',
+            to_tokens=['Dies', ' ', 'ist', ' ', 'ein', ' ', 'Satz', '.'],
+            from_language_code='eng',
+            from_language='English',
+            to_language_code='deu',
+            to_language='German',
+        )
+        for i in range(n_cards)
+    ]
+
+
+def stats_payload(n_days: int = 3650):
+    first = date(2010, 1, 1)
+    return [
+        dict(day=first + timedelta(days=i), correct=i % 50, total=i % 70)
+        for i in range(n_days)
+    ]
+
+
+def benchmark(name: str, payload, number: int):
+    def default():
+        JSONResponse(jsonable_encoder(payload))
+
+    def orjson():
+        ORJSONResponse(payload)
+
+    for label, fn in (('default', default), ('orjson', orjson)):
+        best = min(repeat(fn, number=number, repeat=5)) / number
+        print(f'{name:<12} {label:<8} {best * 1e6:10.1f} us/request')
+
+
+if __name__ == '__main__':
+    benchmark('draw_cards', draw_payload(), 2000)
+    benchmark('stats', stats_payload(), 50)
@@ -1,25 +1,24 @@
 import argparse
+from array import array
 from collections import Counter
 from csv import reader
 import json
+from multiprocessing import Pool
+from pathlib import Path
 from random import Random
-from sys import maxunicode
-from typing import Dict, Tuple, Set
-from unicodedata import category
+from typing import Dict, List, Optional, Tuple, Set
 
 import icu
+import numpy as np
+
+from manifest import Manifest
+from punctuation import PUNCT_TRANSL
+from sentence_store import SentenceStore, SentenceStoreBuilder
+from token_cache import TokenCache
 
 # word breakers instances
 _breakers = {}
 
-# translation table to remove punctuation or spaces
-# this covers all punctuation in the Unicode
-PUNCT_TRANSL = dict.fromkeys(
-    i for i in range(maxunicode)
-    if category(chr(i)).startswith('P')
-    )
-
-
 # how likely is to add an extra cloze
 ANOTHER_CLOZE_FACTOR = 2
 
@@ -49,6 +48,9 @@ FORBIDDEN_CLOZE_TOKENS = {'Layla', 'Maria', 'Mary', 'Marias', 'Muriel', 'Tom'}
 # how long (characters) can a sentence be to be accepted
 MAX_SENTENCE_LENGTH = 250
 
+# sentence pairs given at once to a process making cards
+CHUNK_SIZE = 10_000
+
 
 def normalized(text: str):
     """Remove ounctuation from a token.
@@ -61,8 +63,8 @@ def normalized(text: str):
     return text.translate(PUNCT_TRANSL).lower()
 
 
-def tokenize(text: str, lang: str):
-    """Split a string into tokens."""
+def word_boundaries(text: str, lang: str) -> List[int]:
+    """Find where the tokens of a string end."""
     # Is there no word breaker already set up? Instantiate it
     if lang not in _breakers:
         _breakers[lang] = (
@@ -70,10 +72,20 @@ def tokenize(text: str, lang: str):
             )
 
     _breakers[lang].setText(text)
-    boundaries = list(_breakers[lang])
+    return list(_breakers[lang])
+
+
+def tokenize(text: str, lang: str):
+    """Split a string into tokens."""
+    boundaries = word_boundaries(text, lang)
     return [text[i:j] for i, j in zip([0] + boundaries, boundaries)]
 
 
+def open_token_cache(path: str, readonly: bool = False) -> TokenCache:
+    """Open the cache of the tokens found by the current ICU version."""
+    return TokenCache(path, word_boundaries, f'ICU {icu.ICU_VERSION}', readonly)
+
+
 def get_unambiguous_roots(base_forms_file: str) -> Dict[str, Dict[str, str]]:
     """Get the list of words repleaceable with an unambiguous lemma.
 
@@ -96,25 +108,68 @@ def get_unambiguous_roots(base_forms_file: str) -> Dict[str, Dict[str, str]]:
     return ret
 
 
-def read_sentences(sentence_file: str) -> Tuple[Dict[int, Tuple[str, str]], Dict[str, Set[str]]]:
+def _source_signature(sentence_file: str) -> dict:
+    """Identify a sentence file and the parameters used to read it."""
+    stat = Path(sentence_file).stat()
+    return dict(
+        size=stat.st_size,
+        mtime=stat.st_mtime,
+        max_sentence_length=MAX_SENTENCE_LENGTH,
+        word_min_rank=WORD_MIN_RANK,
+    )
+
+
+def _card_settings() -> dict:
+    """The settings the cards depend on, besides the data."""
+    return dict(
+        another_cloze_factor=ANOTHER_CLOZE_FACTOR,
+        hide_base_form_factor=HIDE_BASE_FORM_FACTOR,
+        max_clozes=MAX_CLOZES,
+        empty_cloze_factor=EMPTY_CLOZE_FACTOR,
+        tolerate_space_factor=TOLERATE_SPACE_FACTOR,
+        word_min_rank=WORD_MIN_RANK,
+        forbidden_cloze_tokens=sorted(FORBIDDEN_CLOZE_TOKENS),
+        max_sentence_length=MAX_SENTENCE_LENGTH,
+    )
+
+
+def read_sentences(
+        sentence_file: str,
+        cache_dir: Optional[str] = None,
+        token_cache: Optional[TokenCache] = None,
+        ) -> Tuple[SentenceStore, Dict[str, Set[str]]]:
     """Read and process a sentence file.
 
     Paramenters
     -----------
     sentence_file: str
         name or path of a sentence file, usually sentences.csv from Tatoeba
+    cache_dir: Optional[str]
+        directory where the result is saved, to be loaded instead of
+        reading the file again as long as the file is the same
+    token_cache: Optional[TokenCache]
+        where to look for the tokens of the sentences before using ICU
 
     Returns
     -------
-    Tuple[Dict[int, Tuple[str, str]], Dict[str, Set[str]]]
+    Tuple[SentenceStore, Dict[str, Set[str]]]
 
     A tuple with two elements:
-    * a dictionary mapping a sentence ID with its language code and content
+    * the sentences, with their ID, language code and content
     * a dictionary mapping each language with a list of most common words
 
     """
+    signature = _source_signature(sentence_file)
+    if cache_dir is not None:
+        store, meta = SentenceStore.load(cache_dir)
+        if store is not None and meta.get('source') == signature:
+            print(f'Loaded {len(store)} sentences from {cache_dir}')
+            most_commons = {
+                lng: set(words) for lng, words in meta['most_commons'].items()}
+            return store, most_commons
+
     sents = reader(open(sentence_file), delimiter='\t')
-    id_sents = {}  # id -> (lang, text)
+    id_sents = SentenceStoreBuilder()
     langs = set()  # set of seen lanuages
     word_counters = {}  # lang -> Counter
     for idx, [_id, lang, text] in enumerate(sents):
@@ -125,11 +180,15 @@ def read_sentences(sentence_file: str) -> Tuple[Dict[int, Tuple[str, str]], Dict
         # null value for the language, ignore it
         if lang == '\\N':
             continue
-        id_sents[int(_id)] = (lang, text)
+        id_sents.add(int(_id), lang, text)
         if lang not in word_counters:
             word_counters[lang] = Counter()
+        if token_cache is None:
+            tokens = tokenize(text, lang)
+        else:
+            tokens = token_cache.tokenize(int(_id), text, lang)
         word_counters[lang].update(
-            [normalized(token) for token in tokenize(text, lang)]
+            [normalized(token) for token in tokens]
         )
         langs.add(lang)
     print(f'Imported {len(id_sents)} sentences')
@@ -143,168 +202,342 @@ def read_sentences(sentence_file: str) -> Tuple[Dict[int, Tuple[str, str]], Dict
         most_commons[lng] = set(
             w for w, _ in word_counters[lng].most_common(WORD_MIN_RANK)
             )
-    return id_sents, most_commons
+    store = id_sents.build()
+    if cache_dir is not None:
+        store.save(
+            cache_dir,
+            dict(
+                source=signature,
+                most_commons={lng: sorted(w) for lng, w in most_commons.items()},
+            ))
+        print(f'Saved the sentences in {cache_dir}')
+    return store, most_commons
+
+
+def make_card(
+        from_lang: str,
+        to_lang: str,
+        from_id: int,
+        to_id: int,
+        from_txt: str,
+        to_txt: str,
+        most_commons: Dict[str, Set[str]],
+        base_forms: Dict[str, Dict[str, str]],
+        tokens: Optional[List[str]] = None,
+        ) -> Optional[Tuple[str, str]]:
+    """Insert the clozes in a sentence pair.
+
+    The result depends only on the arguments, so the cards can be made in
+    any order or process. The tokens of to_txt are found with tokenize
+    when not given.
+
+    Returns
+    -------
+    Optional[Tuple[str, str]]
+        The TSV and JSONL lines of the card, or None when no cloze could be
+        inserted
+    """
+    if tokens is None:
+        tokens = tokenize(to_txt, to_lang)
+    # we must be sure this is always valid or the cards are wrong!
+    assert to_txt == ''.join(tokens)
+    cloze_idx = 1
+    # use the card content to make it deterministic
+    r = Random(to_txt)
+    # do a number of attempts to insert a cloze following some rules
+    for _ in range(20):
+        if cloze_idx > MAX_CLOZES:
+            break
+        to_replace_idx = r.randint(0, len(tokens) - 1)
+        # no cloze of a cloze
+        if tokens[to_replace_idx].startswith('{{'):
+            continue
+        norm_token = normalized(tokens[to_replace_idx])
+        # do not put cloze after empty cloze or space
+        if (
+                to_replace_idx > 0
+                and (
+                    tokens[to_replace_idx - 1].endswith('::-}}')
+                    or tokens[to_replace_idx - 1].endswith(':: }}')
+                    )
+                ):
+            continue
+        # is it an unambiguous inflected form?
+        if norm_token in base_forms.get(to_lang, {}):
+            if r.randint(1, HIDE_BASE_FORM_FACTOR) != 1:
+                tokens[to_replace_idx] = ''.join([
+                    '{{c',
+                    'XXX',
+                    ':',
+                    base_forms[to_lang][norm_token],
+                    ':',
+                    tokens[to_replace_idx],
+                    '}}'
+                ])
+                cloze_idx += 1
+                continue
+
+        # only the most common words
+        if (norm_token not in most_commons[to_lang]):
+            continue
+        if tokens[to_replace_idx] == ' ':
+            if r.randint(1, TOLERATE_SPACE_FACTOR) != 1:
+                continue
+            # if the next element is a cloze, do not replace or would
+            # be ambiguous for the user
+            if (to_replace_idx < len(tokens) - 1
+                    and tokens[to_replace_idx + 1].startswith('{{')):
+                continue
+        # ignore forbidden words
+        if tokens[to_replace_idx] in FORBIDDEN_CLOZE_TOKENS:
+            continue
+        tokens[to_replace_idx] = ''.join([
+            '{{c',
+            'XXX',
+            '::',
+            tokens[to_replace_idx],
+            '}}'
+        ])
+        cloze_idx += 1
+        if cloze_idx > MAX_CLOZES:
+            continue
 
+        if r.randint(1, EMPTY_CLOZE_FACTOR) == 1:
+            to_insert_idx = r.randint(0, len(tokens) - 1)
+            # do it only if there'not a cloze on the right
+            # otherwise the user has no way to know this is a fake one
+            if (
+                to_insert_idx == len(tokens) - 1
+                    or not tokens[to_insert_idx].startswith('{{')):
+                tokens.insert(
+                    to_insert_idx,
+                    '{{cXXX::-}}'
+                )
+                cloze_idx += 1
+                if cloze_idx > MAX_CLOZES:
+                    continue
+
+        if r.randint(0, ANOTHER_CLOZE_FACTOR) == 0:
+            continue
+        break
+
+    if cloze_idx == 1:
+        return None
+    # replace XXX with the cloze ids, so they are ordered
+    cloze_idx = 1
+    for i, t in enumerate(tokens):
+        if t.startswith('{{'):
+            tokens[i] = t.replace('XXX', str(cloze_idx))
+            cloze_idx += 1
 
-def main_multi(sentence_file: str, link_file: str, base_forms_file: str):
+    tsv_line = from_txt + '<br>' + ' '.join(tokens) + '\n'
+    jsonl_line = json.dumps(dict(
+        from_lang=from_lang,
+        to_lang=to_lang,
+        from_id=from_id,
+        to_id=to_id,
+        from_txt=from_txt,
+        original_txt=to_txt,
+        resulting_tokens=tokens,
+    )) + '\n'
+    return tsv_line, jsonl_line
+
+
+# set in every process making cards by _init_card_maker
+_card_maker_data = {}
+
+
+def _init_card_maker(
+        store: SentenceStore,
+        most_commons: Dict[str, Set[str]],
+        base_forms: Dict[str, Dict[str, str]],
+        token_cache_file: Optional[str],
+        readonly: bool):
+    _card_maker_data['store'] = store
+    _card_maker_data['most_commons'] = most_commons
+    _card_maker_data['base_forms'] = base_forms
+    _card_maker_data['token_cache'] = None
+    if token_cache_file is not None:
+        _card_maker_data['token_cache'] = open_token_cache(
+            token_cache_file, readonly)
+
+
+def _make_cards(
+        rows: Tuple[np.ndarray, np.ndarray]) -> List[Optional[Tuple[str, str]]]:
+    """Make the cards of the sentence pairs in the given rows of the store."""
+    store = _card_maker_data['store']
+    token_cache = _card_maker_data['token_cache']
+    cards = []
+    for from_row, to_row in zip(*rows):
+        to_id = int(store.ids[to_row])
+        to_lang = store.language(to_row)
+        to_txt = store.sentence(to_row)
+        cards.append(make_card(
+            store.language(from_row),
+            to_lang,
+            int(store.ids[from_row]),
+            to_id,
+            store.sentence(from_row),
+            to_txt,
+            _card_maker_data['most_commons'],
+            _card_maker_data['base_forms'],
+            None if token_cache is None else token_cache.tokenize(
+                to_id, to_txt, to_lang),
+        ))
+    return cards
+
+
+def _sentence_words(
+        store: SentenceStore,
+        token_cache: Optional[TokenCache],
+        sentence_id: int) -> Set[str]:
+    """The normalized tokens of a sentence, as compared to the word lists."""
+    row = store.find(np.array([sentence_id]))[0]
+    text = store.sentence(row)
+    lang = store.language(row)
+    if token_cache is None:
+        tokens = tokenize(text, lang)
+    else:
+        tokens = token_cache.tokenize(sentence_id, text, lang)
+    return {normalized(token) for token in tokens}
+
+
+def _delete_line(from_id: int, to_id: int) -> str:
+    return json.dumps(dict(
+        op='delete', from_id=int(from_id), to_id=int(to_id))) + '\n'
+
+
+def main_multi(
+        sentence_file: str,
+        link_file: str,
+        base_forms_file: str,
+        workers: int = 1,
+        sentence_cache: Optional[str] = None,
+        token_cache_file: Optional[str] = None,
+        manifest_dir: Optional[str] = None,
+        incremental: bool = False):
     """Produce the cloze deletion cards.
 
     This will produce them for all the language pairs!
+    The cards are made by the given number of processes.
+
+    When a manifest directory is given, the manifest of the run is saved
+    there. In incremental mode only the cards which changed since the run
+    of the manifest found there are made, and instead of the full files
+    universal_cards_delta.jsonl is written, with a line for each card to
+    insert or update and for each one to delete.
     """
     print(f'Processing files {sentence_file}, {link_file}, {base_forms_file}...')
 
-    links = reader(open(link_file), delimiter='\t')
-
-    id_sents, most_commons = read_sentences(sentence_file)
+    if token_cache_file is None:
+        token_cache = None
+    else:
+        token_cache = open_token_cache(token_cache_file)
+    store, most_commons = read_sentences(
+        sentence_file, sentence_cache, token_cache)
+    if token_cache is not None:
+        print(f'Tokens from the cache: {token_cache.hits}, '
+              f'found by ICU: {token_cache.misses}')
     base_forms = get_unambiguous_roots(base_forms_file)
 
-    pairs = []
-    for idx, [from_id, to_id] in enumerate(links):
-        from_id = int(from_id)
-        to_id = int(to_id)
-        if idx % 100_000 == 0:
-            print(f'Read {idx} rows from the links CSV so far')
-        if from_id not in id_sents or to_id not in id_sents:
-            continue
-        pairs.append(
-            (
-                id_sents[from_id][0],  # from language
-                id_sents[to_id][0],  # to language
-                from_id,  # from sentence id
-                to_id,  # to sentence id
-                id_sents[from_id][1],  # from text
-                id_sents[to_id][1],  # to text
-            )
-        )
-
-    print(f'Found {len(pairs)} sentence pairs, shuffling...')
+    from_rows, to_rows = store.resolve_links(link_file)
+    print(f'Found {len(from_rows)} sentence pairs, shuffling...')
     # this is because similar sentences are inserted close in time
-    # by shuffling they will be inserted in random order and an unsorted
-    # select in postgres will give them in that order in the current
-    # implementation. Decent random sampling from the DB is a bit expensive
-    Random(42).shuffle(pairs)
+    # the DB does not depend on it, the populate script gives the cards
+    # a random order on its own, but it keeps the files easier to sample
+    # the permutation depends only on the length, so shuffling the positions
+    # gives the same order the pairs had when shuffled as a list
+    order = array('q', range(len(from_rows)))
+    Random(42).shuffle(order)
+    order = np.frombuffer(order, dtype=np.int64)
+    from_rows = from_rows[order]
+    to_rows = to_rows[order]
     print('Shuffled')
-    out = open('universal_cards.tsv', 'w')
-    out_details = open('universal_cards.jsonl', 'w')
-    for idx, (
-        from_lang,
-        to_lang,
-        from_id,
-        to_id,
-        from_txt,
-        to_txt
-            ) in enumerate(pairs):
-        tokens = tokenize(to_txt, to_lang)
-        # we must be sure this is always valid or the cards are wrong!
-        assert to_txt == ''.join(tokens)
-        cloze_idx = 1
-        if idx % 50_000 == 0:
-            print(f'Written {idx} cards out of {len(pairs)} so far')
-        # use the card content to make it deterministic
-        r = Random(to_txt)
-        # do a number of attempts to insert a cloze following some rules
-        for _ in range(20):
-            if cloze_idx > MAX_CLOZES:
-                break
-            to_replace_idx = r.randint(0, len(tokens) - 1)
-            # no cloze of a cloze
-            if tokens[to_replace_idx].startswith('{{'):
-                continue
-            norm_token = normalized(tokens[to_replace_idx])
-            # do not put cloze after empty cloze or space
-            if (
-                    to_replace_idx > 0
-                    and (
-                        tokens[to_replace_idx - 1].endswith('::-}}')
-                        or tokens[to_replace_idx - 1].endswith(':: }}')
-                        )
-                    ):
+    manifest = None
+    if manifest_dir is not None:
+        manifest = Manifest.build(
+            store,
+            from_rows,
+            to_rows,
+            most_commons,
+            base_forms,
+            _card_settings())
+    removed_links = None
+    if incremental:
+        previous = Manifest.load(manifest_dir)
+        if previous is None:
+            raise ValueError(f'There is no manifest in {manifest_dir}')
+        changed = previous.changed_links(
+            manifest,
+            lambda sentence_id: _sentence_words(store, token_cache, sentence_id))
+        removed_links = previous.removed_links(manifest)
+        from_rows = from_rows[changed]
+        to_rows = to_rows[changed]
+        print(f'{len(from_rows)} sentence pairs changed, '
+              f'{len(removed_links)} links removed')
+    if token_cache is not None:
+        token_cache.close()
+    n_pairs = len(from_rows)
+    # only the positions go to the processes, which read the sentences
+    chunks = (
+        (from_rows[i:i + CHUNK_SIZE], to_rows[i:i + CHUNK_SIZE])
+        for i in range(0, n_pairs, CHUNK_SIZE))
+    if workers > 1:
+        # every process has its own word breakers, and imap keeps the order
+        # of the chunks, so the output is the same of a single process
+        # only reading the token cache, SQLite has a single writer
+        pool = Pool(
+            workers,
+            _init_card_maker,
+            (store, most_commons, base_forms, token_cache_file, True))
+        card_chunks = pool.imap(_make_cards, chunks)
+    else:
+        pool = None
+        _init_card_maker(
+            store, most_commons, base_forms, token_cache_file, False)
+        card_chunks = map(_make_cards, chunks)
+
+    if incremental:
+        out = None
+        out_details = open('universal_cards_delta.jsonl', 'w')
+    else:
+        out = open('universal_cards.tsv', 'w')
+        out_details = open('universal_cards.jsonl', 'w')
+    done = 0
+    for cards in card_chunks:
+        for idx, card in enumerate(cards, start=done):
+            if incremental:
+                if card is None:
+                    # it may have had a card before the change
+                    out_details.write(_delete_line(
+                        store.ids[from_rows[idx]], store.ids[to_rows[idx]]))
+                else:
+                    out_details.write(json.dumps(dict(
+                        op='upsert', **json.loads(card[1]))) + '\n')
                 continue
-            # is it an unambiguous inflected form?
-            if norm_token in base_forms.get(to_lang, {}):
-                if r.randint(1, HIDE_BASE_FORM_FACTOR) != 1:
-                    tokens[to_replace_idx] = ''.join([
-                        '{{c',
-                        'XXX',
-                        ':',
-                        base_forms[to_lang][norm_token],
-                        ':',
-                        tokens[to_replace_idx],
-                        '}}'
-                    ])
-                    cloze_idx += 1
-                    continue
-
-            # only the most common words
-            if (norm_token not in most_commons[to_lang]):
+            if card is None:
                 continue
-            if tokens[to_replace_idx] == ' ':
-                if r.randint(1, TOLERATE_SPACE_FACTOR) != 1:
-                    continue
-                # if the next element is a cloze, do not replace or would
-                # be ambiguous for the user
-                if (to_replace_idx < len(tokens) - 1
-                        and tokens[to_replace_idx + 1].startswith('{{')):
-                    continue
-            # ignore forbidden words
-            if tokens[to_replace_idx] in FORBIDDEN_CLOZE_TOKENS:
-                continue
-            tokens[to_replace_idx] = ''.join([
-                '{{c',
-                'XXX',
-                '::',
-                tokens[to_replace_idx],
-                '}}'
-            ])
-            cloze_idx += 1
-            if cloze_idx > MAX_CLOZES:
-                continue
-
-            if r.randint(1, EMPTY_CLOZE_FACTOR) == 1:
-                to_insert_idx = r.randint(0, len(tokens) - 1)
-                # do it only if there'not a cloze on the right
-                # otherwise the user has no way to know this is a fake one
-                if (
-                    to_insert_idx == len(tokens) - 1
-                        or not tokens[to_insert_idx].startswith('{{')):
-                    tokens.insert(
-                        to_insert_idx,
-                        '{{cXXX::-}}'
-                    )
-                    cloze_idx += 1
-                    if cloze_idx > MAX_CLOZES:
-                        continue
-
-            if r.randint(0, ANOTHER_CLOZE_FACTOR) == 0:
-                continue
-            break
-
-        if cloze_idx == 1:
-            continue
-        out.write(from_txt)
-        out.write('<br>')
-        # replace XXX with the cloze ids, so they are ordered
-        cloze_idx = 1
-        for i, t in enumerate(tokens):
-            if t.startswith('{{'):
-                tokens[i] = t.replace('XXX', str(cloze_idx))
-                cloze_idx += 1
-
-        out.write(' '.join(tokens))
-        out.write('\n')
-
-        out_details.write(json.dumps(dict(
-            from_lang=from_lang,
-            to_lang=to_lang,
-            from_id=from_id,
-            to_id=to_id,
-            from_txt=from_txt,
-            original_txt=to_txt,
-            resulting_tokens=tokens,
-        )))
-        out_details.write('\n')
-    out.close()
+            tsv_line, jsonl_line = card
+            out.write(tsv_line)
+            out_details.write(jsonl_line)
+        if done // 50_000 != (done + len(cards)) // 50_000:
+            print(f'Processed {done + len(cards)} pairs out of {n_pairs} so far')
+        done += len(cards)
+    if removed_links is not None:
+        for from_id, to_id in removed_links:
+            out_details.write(_delete_line(from_id, to_id))
+    if out is not None:
+        out.close()
     out_details.close()
+    if pool is not None:
+        pool.close()
+        pool.join()
+    elif _card_maker_data['token_cache'] is not None:
+        _card_maker_data['token_cache'].close()
+    # only once the cards are written, or they would be missed next time
+    if manifest is not None:
+        manifest.save(manifest_dir)
+        print(f'Saved the manifest in {manifest_dir}')
 
 
 if __name__ == '__main__':
@@ -312,6 +545,45 @@ if __name__ == '__main__':
     parser.add_argument('sentences', help='the sentence CSV file', type=str)
     parser.add_argument('links', help='the links CSV file', type=str)
     parser.add_argument('base_forms', help='the base forms JSONL file', type=str)
+    parser.add_argument(
+        '--workers',
+        help='how many processes make the cards, the output is the same',
+        type=int,
+        default=1)
+
+    parser.add_argument(
+        '--sentence-cache',
+        help='directory to save the processed sentences, to reuse them '
+             'in the next runs while the sentence file does not change',
+        type=str)
+
+    parser.add_argument(
+        '--token-cache',
+        help='SQLite file where the tokens of the sentences are kept, to '
+             'tokenize again in the next runs only new or edited sentences',
+        type=str)
+
+    parser.add_argument(
+        '--manifest',
+        help='directory to save a summary of the inputs of the run, used by '
+             'the next one to find what changed with --incremental',
+        type=str)
+
+    parser.add_argument(
+        '--incremental',
+        help='make only the cards which changed since the run of the '
+             'manifest, writing them to universal_cards_delta.jsonl',
+        action='store_true')
 
     args = parser.parse_args()
-    main_multi(args.sentences, args.links, args.base_forms)
+    if args.incremental and args.manifest is None:
+        parser.error('--incremental requires --manifest')
+    main_multi(
+        args.sentences,
+        args.links,
+        args.base_forms,
+        args.workers,
+        args.sentence_cache,
+        args.token_cache,
+        args.manifest,
+        args.incremental)
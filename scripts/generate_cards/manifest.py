@@ -0,0 +1,189 @@
+"""Summary of the inputs of a run of generate.py, to find what changed later.
+
+A card depends only on its two sentences, the most common words and base
+forms of its target language and the settings of the script, so the
+manifest keeps a hash of each sentence, the words and base forms of each
+language and the settings together with the links. Comparing the manifest
+of the previous run with the current one gives the pairs whose card must
+be made again and the links which are gone, the rest of the cards are the
+same.
+A change of the most common words or base forms affects only the target
+sentences containing one of the words which changed, so new sentences
+shifting the frequency ranking don't make all the cards again.
+"""
+from hashlib import blake2b
+import json
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from sentence_store import SentenceStore
+
+# the arrays saved in a manifest directory, each in a .npy file
+ARRAY_NAMES = (
+    'links', 'sentence_ids', 'sentence_languages', 'sentence_hashes')
+
+
+def _hash(data: bytes) -> bytes:
+    return blake2b(data, digest_size=8).digest()
+
+
+def _link_keys(links: np.ndarray) -> np.ndarray:
+    """A single integer for each (from_id, to_id) pair, ids are 32 bits."""
+    return (links[:, 0] << 32) | links[:, 1]
+
+
+class Manifest:
+    """The links used by a run, and what their cards depend on.
+
+    The links are an array of (from_id, to_id) rows, the sentences the
+    sorted ids of the linked ones, each with its language and a hash of
+    its language and text. The most common words are sorted lists, by
+    language.
+    """
+
+    def __init__(
+            self,
+            links: np.ndarray,
+            sentence_ids: np.ndarray,
+            sentence_languages: np.ndarray,
+            sentence_hashes: np.ndarray,
+            most_commons: Dict[str, List[str]],
+            base_forms: Dict[str, Dict[str, str]],
+            settings: dict):
+        self.links = links
+        self.sentence_ids = sentence_ids
+        self.sentence_languages = sentence_languages
+        self.sentence_hashes = sentence_hashes
+        self.most_commons = most_commons
+        self.base_forms = base_forms
+        self.settings = settings
+
+    @classmethod
+    def build(
+            cls,
+            store: SentenceStore,
+            from_rows: np.ndarray,
+            to_rows: np.ndarray,
+            most_commons: Dict[str, Set[str]],
+            base_forms: Dict[str, Dict[str, str]],
+            settings: dict) -> 'Manifest':
+        """Summarize the sentence pairs in the given rows of a store."""
+        rows = np.unique(np.concatenate([from_rows, to_rows]))
+        sentence_ids = store.ids[rows]
+        order = np.argsort(sentence_ids)
+        languages = [store.language(row) for row in rows[order]]
+        digests = b''.join(
+            _hash(f'{lang}\t{store.sentence(row)}'.encode('utf-8'))
+            for lang, row in zip(languages, rows[order]))
+        return cls(
+            links=np.stack([store.ids[from_rows], store.ids[to_rows]], axis=1),
+            sentence_ids=sentence_ids[order],
+            sentence_languages=np.array(languages, dtype=str),
+            sentence_hashes=np.frombuffer(digests, dtype=np.uint64),
+            most_commons={
+                lng: sorted(words) for lng, words in most_commons.items()},
+            # only the languages with sentences matter
+            base_forms={
+                lng: forms for lng, forms in base_forms.items()
+                if lng in most_commons},
+            settings=settings,
+        )
+
+    def _positions(self, ids: np.ndarray) -> np.ndarray:
+        """Where the sentences with the given ids are, all present."""
+        return np.searchsorted(self.sentence_ids, ids)
+
+    def changed_words(self, current: 'Manifest') -> Dict[str, Set[str]]:
+        """The words of each language which changed, only when there's any.
+
+        A word changed when it entered or left the most common ones, or
+        its base form is different.
+        """
+        changed = {}
+        for lang, words in current.most_commons.items():
+            words_diff = set(words).symmetric_difference(
+                self.most_commons.get(lang, []))
+            old_forms = self.base_forms.get(lang, {})
+            new_forms = current.base_forms.get(lang, {})
+            words_diff.update(
+                word for word in old_forms.keys() | new_forms.keys()
+                if old_forms.get(word) != new_forms.get(word))
+            if len(words_diff) > 0:
+                changed[lang] = words_diff
+        return changed
+
+    def changed_links(
+            self,
+            current: 'Manifest',
+            words_of: Callable[[int], Set[str]]) -> np.ndarray:
+        """Which links of the current manifest need their card made again.
+
+        Parameters
+        ----------
+        current: Manifest
+            the manifest of the current run
+        words_of: Callable[[int], Set[str]]
+            the normalized tokens of the sentence with the given id, used
+            only for the targets in a language whose words changed
+
+        Returns
+        -------
+        np.ndarray
+            A boolean mask over current.links, true for the links which
+            are new, have a sentence that changed or a target sentence
+            with a word whose frequency rank or base form changed
+        """
+        if current.settings != self.settings:
+            return np.ones(len(current.links), dtype=bool)
+        changed = ~np.isin(_link_keys(current.links), _link_keys(self.links))
+        kept = ~changed
+        for column in (0, 1):
+            ids = current.links[kept, column]
+            changed[kept] |= (
+                self.sentence_hashes[self._positions(ids)]
+                != current.sentence_hashes[current._positions(ids)])
+        changed_words = self.changed_words(current)
+        if len(changed_words) > 0:
+            to_ids = current.links[:, 1]
+            to_langs = current.sentence_languages[current._positions(to_ids)]
+            candidates = ~changed & np.isin(to_langs, list(changed_words))
+            # a sentence is often the target of many links, check it once
+            targets = np.unique(to_ids[candidates])
+            target_langs = current.sentence_languages[
+                current._positions(targets)]
+            affected = [
+                to_id for to_id, lang in zip(targets, target_langs)
+                if not changed_words[lang].isdisjoint(words_of(int(to_id)))]
+            changed |= np.isin(to_ids, affected)
+        return changed
+
+    def removed_links(self, current: 'Manifest') -> np.ndarray:
+        """The (from_id, to_id) links of this manifest which are gone."""
+        gone = ~np.isin(_link_keys(self.links), _link_keys(current.links))
+        return self.links[gone]
+
+    def save(self, directory: str):
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        with open(path / 'meta.json', 'w') as f:
+            json.dump(
+                dict(
+                    most_commons=self.most_commons,
+                    base_forms=self.base_forms,
+                    settings=self.settings),
+                f)
+
+    @classmethod
+    def load(cls, directory: str) -> Optional['Manifest']:
+        """Load the manifest saved in a directory, None if there's none."""
+        path = Path(directory)
+        if not (path / 'meta.json').exists():
+            return None
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+        arrays = {name: np.load(path / f'{name}.npy') for name in ARRAY_NAMES}
+        return cls(**arrays, **meta)
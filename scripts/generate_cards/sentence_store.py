@@ -0,0 +1,164 @@
+"""Compact storage of the Tatoeba sentences.
+
+Keeping millions of sentences as Python objects takes many GB, so they are
+stored in a few NumPy arrays instead: the ids, sorted, the language of each
+sentence as a small integer and the text of all of them in a single UTF-8
+buffer, with the offset where each one starts.
+The arrays can be saved in a directory and loaded from there memory mapped,
+so they are read from the disk only when used.
+"""
+from array import array
+import json
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# how many links are read and resolved at once
+LINKS_BLOCK_SIZE = 1_000_000
+
+# the arrays saved in a cache directory, each in a .npy file
+ARRAY_NAMES = ('ids', 'sorted_ids', 'sorted_rows', 'lang_codes', 'offsets', 'text')
+
+
+class SentenceStore:
+    """Sentences, each with its id, language and text.
+
+    The sentences are numbered in the order they were added (rows), and
+    the ids are also kept sorted, with their rows, to look them up.
+    """
+
+    def __init__(
+            self,
+            ids: np.ndarray,
+            sorted_ids: np.ndarray,
+            sorted_rows: np.ndarray,
+            lang_codes: np.ndarray,
+            offsets: np.ndarray,
+            text: np.ndarray,
+            languages: List[str]):
+        self.ids = ids
+        self.sorted_ids = sorted_ids
+        self.sorted_rows = sorted_rows
+        self.lang_codes = lang_codes
+        self.offsets = offsets
+        self.text = text
+        self.languages = languages
+
+    def __len__(self):
+        return len(self.lang_codes)
+
+    def language(self, row: int) -> str:
+        return self.languages[self.lang_codes[row]]
+
+    def sentence(self, row: int) -> str:
+        return bytes(
+            self.text[self.offsets[row]:self.offsets[row + 1]]).decode('utf-8')
+
+    def find(self, ids: np.ndarray) -> np.ndarray:
+        """The rows of the sentences with the given ids, -1 where missing.
+
+        When an id was added more than once, the last sentence is found.
+        """
+        if len(self.sorted_ids) == 0:
+            return np.full(len(ids), -1)
+        pos = np.searchsorted(self.sorted_ids, ids, side='right') - 1
+        pos_ok = np.maximum(pos, 0)
+        found = (pos >= 0) & (self.sorted_ids[pos_ok] == ids)
+        return np.where(found, self.sorted_rows[pos_ok], -1)
+
+    def resolve_links(self, link_file: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Read a links file and find the linked sentences.
+
+        Returns
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            The rows of the source and target sentences of each link, in
+            the order of the file, skipping the links of missing sentences
+        """
+        from_rows = []
+        to_rows = []
+        n_read = 0
+        for block in _read_blocks(link_file, LINKS_BLOCK_SIZE):
+            links = np.fromstring(block, dtype=np.int64, sep=' ').reshape(-1, 2)
+            found_from = self.find(links[:, 0])
+            found_to = self.find(links[:, 1])
+            valid = (found_from >= 0) & (found_to >= 0)
+            from_rows.append(found_from[valid])
+            to_rows.append(found_to[valid])
+            n_read += len(links)
+            print(f'Read {n_read} rows from the links CSV so far')
+        return np.concatenate(from_rows), np.concatenate(to_rows)
+
+    def save(self, directory: str, meta: dict):
+        """Save the sentences, and any JSON serializable meta data."""
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        for name in ARRAY_NAMES:
+            np.save(path / f'{name}.npy', getattr(self, name))
+        with open(path / 'meta.json', 'w') as f:
+            json.dump(dict(meta, languages=self.languages), f)
+
+    @classmethod
+    def load(cls, directory: str) -> Tuple[Optional['SentenceStore'], dict]:
+        """Load memory mapped the sentences saved in a directory.
+
+        Returns the store, or None if there's none, and its meta data.
+        """
+        path = Path(directory)
+        if not (path / 'meta.json').exists():
+            return None, {}
+        with open(path / 'meta.json') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(path / f'{name}.npy', mmap_mode='r')
+            for name in ARRAY_NAMES}
+        return cls(languages=meta.pop('languages'), **arrays), meta
+
+
+class SentenceStoreBuilder:
+    """Collects the sentences one by one to build a SentenceStore."""
+
+    def __init__(self):
+        self._ids = array('q')
+        self._lang_codes = array('H')
+        self._offsets = array('q', [0])
+        self._text = bytearray()
+        self._languages: Dict[str, int] = {}
+
+    def add(self, id_: int, lang: str, text: str):
+        if lang not in self._languages:
+            self._languages[lang] = len(self._languages)
+        self._ids.append(id_)
+        self._lang_codes.append(self._languages[lang])
+        self._text.extend(text.encode('utf-8'))
+        self._offsets.append(len(self._text))
+
+    def __len__(self):
+        return len(self._ids)
+
+    def build(self) -> SentenceStore:
+        ids = np.frombuffer(self._ids, dtype=np.int64)
+        sorted_rows = np.argsort(ids, kind='stable')
+        return SentenceStore(
+            ids=ids,
+            sorted_ids=ids[sorted_rows],
+            sorted_rows=sorted_rows,
+            lang_codes=np.frombuffer(self._lang_codes, dtype=np.uint16),
+            offsets=np.frombuffer(self._offsets, dtype=np.int64),
+            text=np.frombuffer(self._text, dtype=np.uint8),
+            languages=list(self._languages),
+        )
+
+
+def _read_blocks(file_name: str, n_lines: int) -> Iterable[str]:
+    """Read a text file in blocks of lines."""
+    with open(file_name) as f:
+        block = []
+        for line in f:
+            block.append(line)
+            if len(block) == n_lines:
+                yield ''.join(block)
+                block = []
+        if len(block) > 0:
+            yield ''.join(block)
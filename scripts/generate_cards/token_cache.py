@@ -0,0 +1,91 @@
+"""Persistent cache of the word boundaries of the sentences.
+
+Word segmentation with ICU is the slowest part of the card generation, and
+it's done twice for most sentences: once to count the words and once to
+insert the clozes. The boundaries are saved in a SQLite file, by sentence
+id and a hash of the language and text, so a sentence is segmented again
+only when it's new or was edited, also between different Tatoeba dumps.
+"""
+from array import array
+from hashlib import blake2b
+import sqlite3
+from typing import Callable, List
+
+# rows inserted before committing
+COMMIT_EVERY = 50_000
+
+
+def _text_hash(text: str, lang: str) -> bytes:
+    return blake2b(f'{lang}\t{text}'.encode('utf-8'), digest_size=8).digest()
+
+
+class TokenCache:
+    """Tokenizes sentences, reusing the boundaries found in previous runs.
+
+    The cache is emptied when the version, e.g. the one of ICU, changes.
+    A read-only cache does not store the boundaries of new sentences, it
+    can be shared by many processes.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            word_boundaries: Callable[[str, str], List[int]],
+            version: str,
+            readonly: bool = False):
+        self.word_boundaries = word_boundaries
+        self.readonly = readonly
+        self.hits = 0
+        self.misses = 0
+        self._pending = 0
+        if readonly:
+            self._conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            return
+        self._conn = sqlite3.connect(path)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        # it's a cache, losing it is not a problem
+        self._conn.execute('PRAGMA synchronous=OFF')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self._conn.execute(
+            '''CREATE TABLE IF NOT EXISTS boundaries (
+                id INTEGER PRIMARY KEY,
+                text_hash BLOB NOT NULL,
+                boundaries BLOB NOT NULL
+            )''')
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row is None or row[0] != version:
+            self._conn.execute('DELETE FROM boundaries')
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (version,))
+        self._conn.commit()
+
+    def tokenize(self, sentence_id: int, text: str, lang: str) -> List[str]:
+        """Split a sentence into tokens."""
+        text_hash = _text_hash(text, lang)
+        row = self._conn.execute(
+            'SELECT text_hash, boundaries FROM boundaries WHERE id = ?',
+            (sentence_id,)).fetchone()
+        if row is not None and row[0] == text_hash:
+            self.hits += 1
+            boundaries = array('H', row[1])
+        else:
+            self.misses += 1
+            boundaries = self.word_boundaries(text, lang)
+            if not self.readonly:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO boundaries VALUES (?, ?, ?)',
+                    (sentence_id, text_hash, array('H', boundaries).tobytes()))
+                self._pending += 1
+                if self._pending >= COMMIT_EVERY:
+                    self.commit()
+        return [text[i:j] for i, j in zip([0, *boundaries], boundaries)]
+
+    def commit(self):
+        self._conn.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
@@ -0,0 +1,20 @@
+-- copy the card languages on the user state and index the due queue
+ALTER TABLE card_user_state
+    ADD COLUMN from_lang SMALLINT,
+    ADD COLUMN to_lang   SMALLINT;
+
+UPDATE card_user_state cus
+SET
+    from_lang = c.from_lang,
+    to_lang   = c.to_lang
+FROM card c
+WHERE
+      c.from_id = cus.from_id
+  AND c.to_id = cus.to_id;
+
+ALTER TABLE card_user_state
+    ALTER COLUMN from_lang SET NOT NULL,
+    ALTER COLUMN to_lang   SET NOT NULL;
+
+CREATE INDEX card_user_state_due_index
+    ON card_user_state(account_id, to_lang, next_review, from_lang);
@@ -0,0 +1,5 @@
+-- add the card ids to the due queue index, they break the ties in pagination
+DROP INDEX card_user_state_due_index;
+
+CREATE INDEX card_user_state_due_index
+    ON card_user_state(account_id, to_lang, next_review, from_id, to_id, from_lang);
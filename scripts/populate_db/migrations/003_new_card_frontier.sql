@@ -0,0 +1,18 @@
+-- give a stable order to the cards and track how far each user went
+CREATE SEQUENCE card_seq;
+
+ALTER TABLE card
+    ADD COLUMN seq BIGINT NOT NULL DEFAULT nextval('card_seq');
+
+DROP INDEX card_from_lang_to_lang_index;
+
+CREATE INDEX card_from_lang_to_lang_index
+    ON card(from_lang, to_lang, seq);
+
+CREATE TABLE new_card_frontier (
+    account_id  INTEGER  NOT NULL,
+    from_lang   SMALLINT NOT NULL,
+    to_lang     SMALLINT NOT NULL,
+    seq         BIGINT   NOT NULL,
+    PRIMARY KEY (account_id, from_lang, to_lang)
+);
@@ -0,0 +1,27 @@
+-- shuffle the card order and let every user start from a different point
+-- the frontiers are only an optimization, so they can be dropped
+TRUNCATE new_card_frontier;
+
+ALTER TABLE new_card_frontier
+    RENAME COLUMN seq TO after_start_seq;
+
+ALTER TABLE new_card_frontier
+    ALTER COLUMN after_start_seq DROP NOT NULL,
+    ADD COLUMN start_seq        BIGINT NOT NULL,
+    ADD COLUMN before_start_seq BIGINT;
+
+UPDATE card c
+SET
+    seq = r.seq
+FROM (
+    SELECT
+        from_id,
+        to_id,
+        row_number() OVER (ORDER BY random()) AS seq
+    FROM card
+    ) r
+WHERE
+      c.from_id = r.from_id
+  AND c.to_id = r.to_id;
+
+SELECT setval('card_seq', (SELECT max(seq) FROM card));
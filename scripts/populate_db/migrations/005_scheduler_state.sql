@@ -0,0 +1,10 @@
+-- store the state of the FSRS scheduler and when a card was last reviewed
+ALTER TABLE card_user_state
+    ADD COLUMN last_review TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN stability   REAL,
+    ADD COLUMN difficulty  REAL;
+
+-- an approximation, the SM-2 interval is close to the time between reviews
+UPDATE card_user_state
+SET
+    last_review = next_review - i_factor * '1 day' :: INTERVAL;
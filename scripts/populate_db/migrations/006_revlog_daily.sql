@@ -0,0 +1,34 @@
+-- daily stats per user, computed once from the revlog and then kept updated
+-- by the app; running it again recomputes them from scratch, better with the
+-- app stopped or the answers given in the meantime may not be counted
+-- there are no stats of the anonymous user (1)
+CREATE TABLE IF NOT EXISTS revlog_daily (
+    account_id INTEGER NOT NULL,
+    day        DATE    NOT NULL,
+    correct    INTEGER NOT NULL,
+    total      INTEGER NOT NULL,
+    PRIMARY KEY (account_id, day)
+);
+
+INSERT INTO revlog_daily AS rd (
+    account_id,
+    day,
+    correct,
+    total
+    )
+SELECT
+    account_id,
+    (review_time AT TIME ZONE 'UTC') :: DATE,
+    count(1) FILTER (WHERE correct),
+    count(1)
+FROM revlog
+WHERE
+    account_id <> 1
+GROUP BY
+    account_id,
+    (review_time AT TIME ZONE 'UTC') :: DATE
+ON CONFLICT (account_id, day) DO UPDATE SET
+    correct = EXCLUDED.correct,
+    total   = EXCLUDED.total;
+
+DELETE FROM revlog_daily WHERE account_id = 1;
@@ -0,0 +1,4 @@
+-- the revlog of a user is exported in chronological order
+CREATE INDEX revlog_account_id_review_time_idx ON revlog(account_id, review_time);
+
+DROP INDEX revlog_account_id_idx;
@@ -18,6 +18,14 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# the web app listens on this channel to refresh its cached language table
+LANGUAGE_CHANNEL = 'language_changed'
+
+# around 10 cards are deleted per day, too many may be an issue with the
+# file, so better stop rather than deleting everything (and the progress of
+# the users on those cards), unless forced
+MAX_DELETIONS = 500
+
 
 async def store_language_codes(conn: Connection) -> Dict[str, int]:
     """Update the language codes and return the code -> id dictionary.
@@ -26,6 +34,9 @@ async def store_language_codes(conn: Connection) -> Dict[str, int]:
 
     If a language is in the DB but not in the hardcoded list, an exception is raised.
 
+    When something changed a notification is sent on LANGUAGE_CHANNEL, so
+    running instances of the app can reload it.
+
     Returns
     -------
     Dict[str, int]
@@ -38,6 +49,7 @@ async def store_language_codes(conn: Connection) -> Dict[str, int]:
     """
     languages_ids = {}  # ISO -> (id, name)
     max_id = 0
+    changed = False
     async with conn.transaction():
         res = await conn.fetch('SELECT id, name, iso693_3 FROM language')
         for lng in res:
@@ -60,6 +72,7 @@ async def store_language_codes(conn: Connection) -> Dict[str, int]:
                     name,
                     iso,
                 )
+                changed = True
         else:
             # not there, insert it
             max_id += 1
@@ -73,6 +86,9 @@ async def store_language_codes(conn: Connection) -> Dict[str, int]:
                     VALUES ($1, $2, $3)""",
                 max_id, iso, name
                 )
+            changed = True
+    if changed:
+        await conn.execute(f'NOTIFY {LANGUAGE_CHANNEL}')
     # now all of ISO_693_3 elements are in the DB and in language_ids
     # let's check for language_ids which are gone
 
@@ -157,7 +173,7 @@ async def ingest_cards_file(
         )
 
 
-async def merge_tables(conn: Connection, p_id: int):
+async def merge_tables(conn: Connection, p_id: int, force: bool = False):
     """Merge the staging table and the final one."""
     async with conn.transaction():
         logger.debug('Detecting cards no longer valid...')
@@ -168,9 +184,7 @@ async def merge_tables(conn: Connection, p_id: int):
                 USING (from_id, to_id)
             WHERE s.from_id IS NULL
             """)
-        if res['to_delete'] > 500:
-            # around 10 cards are deleted per day, too many may be an issue with the
-            # file, so better stop rather than deleting everything
+        if res['to_delete'] > MAX_DELETIONS and not force:
             raise ValueError(f"Suspect number of cards to delete: {res['to_delete']}")
         if res['to_delete'] > 0:
             logger.info(f"Found {res['to_delete']} invalid cards, deleting them")
@@ -207,29 +221,145 @@ async def merge_tables(conn: Connection, p_id: int):
         logger.info(f'Update successful: changes {res}')
         logger.info('Inserting new cards...')
         res = await conn.fetchrow(f"""
-        INSERT INTO card_h{p_id}
+        INSERT INTO card_h{p_id}(
+            from_lang,
+            to_lang,
+            from_id,
+            to_id,
+            from_txt,
+            original_txt,
+            to_tokens)
             SELECT
-                s.*
+                s.from_lang,
+                s.to_lang,
+                s.from_id,
+                s.to_id,
+                s.from_txt,
+                s.original_txt,
+                s.to_tokens
             FROM
                 card_stg_h{p_id} s
                 LEFT JOIN card_h{p_id} c
                     USING(from_id, to_id)
             WHERE
                 c.from_lang IS NULL
+            -- seq is assigned in this order, and new cards are drawn by it
+            ORDER BY random()
+        """)
+
+
+async def apply_delta_file(
+        conn: Connection,
+        jsonl_file: str,
+        languages_ids: Dict[str, int],
+        force: bool = False):
+    """Apply the changes listed by an incremental run of generate.py.
+
+    Every line is a card to insert or update, with op "upsert", or the
+    from_id and to_id of a card to delete, with op "delete". Everything is
+    applied in a single transaction, which is rolled back when more than
+    MAX_DELETIONS cards would be deleted, unless forced.
+    """
+    upserts = []
+    deletes = []
+    for line in open(jsonl_file):
+        card = json.loads(line)
+        try:
+            if card['op'] == 'delete':
+                deletes.append((card['from_id'], card['to_id']))
+                continue
+            upserts.append((
+                languages_ids[card['from_lang']],
+                languages_ids[card['to_lang']],
+                card['from_id'],
+                card['to_id'],
+                card['from_txt'],
+                card['original_txt'],
+                card['resulting_tokens'],
+            ))
+        except KeyError as ke:
+            # missing language or weird line
+            logger.warning(f'Error processing a row: {line}: {ke}')
+    logger.info(f'{len(upserts)} cards to upsert, {len(deletes)} to delete')
+    async with conn.transaction():
+        await conn.execute("""
+        CREATE TEMPORARY TABLE card_delta (
+            from_lang    SMALLINT NOT NULL,
+            to_lang      SMALLINT NOT NULL,
+            from_id      INTEGER  NOT NULL,
+            to_id        INTEGER  NOT NULL,
+            from_txt     TEXT     NOT NULL,
+            original_txt TEXT     NOT NULL,
+            to_tokens    TEXT[]   NOT NULL
+        ) ON COMMIT DROP
         """)
+        await conn.copy_records_to_table('card_delta', records=upserts)
+        res = await conn.execute(
+            """DELETE FROM card
+                WHERE (from_id, to_id) IN (
+                    SELECT * FROM unnest($1::INTEGER[], $2::INTEGER[]))
+            """,
+            [from_id for from_id, _ in deletes],
+            [to_id for _, to_id in deletes],
+        )
+        # the delta lists also pairs which may have had a card, so only the
+        # rows actually deleted count
+        deleted = int(res.split()[-1])
+        if deleted > MAX_DELETIONS and not force:
+            raise ValueError(f'Suspect number of cards to delete: {deleted}')
+        logger.info(f'Deletion successful: {res}')
+        res = await conn.execute("""
+        INSERT INTO card(
+            from_lang,
+            to_lang,
+            from_id,
+            to_id,
+            from_txt,
+            original_txt,
+            to_tokens)
+            SELECT
+                from_lang,
+                to_lang,
+                from_id,
+                to_id,
+                from_txt,
+                original_txt,
+                to_tokens
+            FROM (
+                SELECT DISTINCT ON (from_id, to_id) *
+                FROM card_delta
+            ) d
+            -- seq is assigned in this order, and new cards are drawn by it
+            ORDER BY random()
+        ON CONFLICT (from_id, to_id) DO UPDATE
+            SET
+                from_txt     = EXCLUDED.from_txt,
+                original_txt = EXCLUDED.original_txt,
+                to_tokens    = EXCLUDED.to_tokens
+            -- most cards in the delta are the same, don't rewrite them
+            WHERE
+                (card.from_txt, card.original_txt, card.to_tokens)
+                IS DISTINCT FROM
+                (EXCLUDED.from_txt, EXCLUDED.original_txt, EXCLUDED.to_tokens)
+        """)
+        logger.info(f'Upsert successful: {res}')
 
 
-async def main(jsonl_file: str):
+async def main(jsonl_file: str, delta: bool = False, force: bool = False):
     conn = await asyncpg.connect(dsn=environ['PG_CONN_STR'])
     language_ids = await store_language_codes(conn)
     logger.info(f'There are {len(language_ids)} total languages')
+    if delta:
+        await apply_delta_file(conn, jsonl_file, language_ids, force)
+        await conn.close()
+        return
     await create_staging_table(conn)
     logger.info('Staging table ready, ingesting the cards...')
     await ingest_cards_file(conn, jsonl_file, language_ids)
     logger.info('Staging table ingested!')
     for i in range(10):
         logger.info(f'Merging partition {i}')
-        await merge_tables(conn, i)
+        await merge_tables(conn, i, force)
     await delete_staging_table(conn)
     # TODO and maybe also a VACUUM ANALYZE to be safe
     await conn.close()
@@ -238,8 +368,18 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument(
         'cards_file', help='the JSONL file to import', type=str)
+    parser.add_argument(
+        '--delta',
+        help='the file is a delta written by generate.py --incremental, '
+             'apply it instead of comparing all the cards',
+        action='store_true')
+    parser.add_argument(
+        '--force',
+        help=f'delete the cards even when they are more than {MAX_DELETIONS}, '
+             'together with the progress of the users on them',
+        action='store_true')
     args = parser.parse_args()
     # this is not taking advantage of any async operation
     # but the library is used in the app so it's used here for consistency
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(main(args.cards_file))
+    loop.run_until_complete(main(args.cards_file, args.delta, args.force))
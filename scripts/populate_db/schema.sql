@@ -4,6 +4,11 @@ CREATE TABLE language (
     name     TEXT
 );
 
+-- gives a stable random order to the cards, new cards are drawn following it
+-- the populate script inserts the cards in random order, so the values
+-- are a random permutation with the cards added later at the end
+CREATE SEQUENCE card_seq;
+
 CREATE TABLE card (
     from_lang    SMALLINT NOT NULL REFERENCES language,
     to_lang      SMALLINT NOT NULL REFERENCES language,
@@ -12,6 +17,7 @@ CREATE TABLE card (
     from_txt     TEXT     NOT NULL,
     original_txt TEXT     NOT NULL,
     to_tokens    TEXT[]   NOT NULL,
+    seq          BIGINT   NOT NULL DEFAULT nextval('card_seq'),
     PRIMARY KEY (from_id, to_id)
 ) PARTITION BY HASH (from_id, to_id);
 
@@ -57,7 +63,7 @@ CREATE TABLE card_h9
         FOR VALUES WITH (MODULUS 10, REMAINDER 9);
 
 CREATE INDEX card_from_lang_to_lang_index
-    ON card(from_lang, to_lang);
+    ON card(from_lang, to_lang, seq);
 
 CREATE SEQUENCE account_id_seq;
 
@@ -72,13 +78,25 @@ CREATE TABLE card_user_state (
     from_id     INTEGER                  NOT NULL,
     to_id       INTEGER                  NOT NULL,
     account_id  INTEGER                  NOT NULL,
+    -- copied from the card, so the due queue can be filtered by language
+    from_lang   SMALLINT                 NOT NULL,
+    to_lang     SMALLINT                 NOT NULL,
     next_review TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_review TIMESTAMP WITH TIME ZONE,
+    -- SM-2 scheduler state
     i_factor    SMALLINT,
     ef_factor   REAL,
+    -- FSRS scheduler state
+    stability   REAL,
+    difficulty  REAL,
     FOREIGN KEY (from_id, to_id) REFERENCES card(from_id, to_id) ON DELETE CASCADE,
     PRIMARY KEY (from_id, to_id, account_id)
 );
 
+-- the due queue of a user for a language pair, in the order it's paginated
+CREATE INDEX card_user_state_due_index
+    ON card_user_state(account_id, to_lang, next_review, from_id, to_id, from_lang);
+
 
 CREATE TABLE revlog (
     from_id          INTEGER                  NOT NULL,
@@ -92,7 +110,31 @@ CREATE TABLE revlog (
     PRIMARY KEY (from_id, to_id, account_id, review_time)
 );
 
-CREATE INDEX ON revlog(account_id);
+CREATE INDEX revlog_account_id_review_time_idx ON revlog(account_id, review_time);
+
+-- daily number of answers per user, kept updated with the revlog
+-- the days are in UTC
+CREATE TABLE revlog_daily (
+    account_id INTEGER NOT NULL,
+    day        DATE    NOT NULL,
+    correct    INTEGER NOT NULL,
+    total      INTEGER NOT NULL,
+    PRIMARY KEY (account_id, day)
+);
+
+-- every user goes through the cards of a language pair in seq order,
+-- starting from start_seq and then wrapping around to the cards before it
+-- all the cards from start_seq to after_start_seq, and from the beginning
+-- to before_start_seq, have already been seen
+CREATE TABLE new_card_frontier (
+    account_id       INTEGER  NOT NULL,
+    from_lang        SMALLINT NOT NULL,
+    to_lang          SMALLINT NOT NULL,
+    start_seq        BIGINT   NOT NULL,
+    after_start_seq  BIGINT,
+    before_start_seq BIGINT,
+    PRIMARY KEY (account_id, from_lang, to_lang)
+);
 
 -- users logging in with credentials, not SSO
 CREATE TABLE account_internal (
@@ -1,7 +1,19 @@
+import asyncio
+import json
+
+from fastapi import status
 from fastapi.testclient import TestClient
 import pytest
+from starlette.websockets import WebSocketDisconnect
 
-from backend.app import app
+from backend.app import (
+    answer_endpoints,
+    app,
+    bulk_endpoints,
+    card_endpoints,
+    quiz_session,
+)
+from backend.dbutil import get_conn, pool_stats
 
 
 @pytest.fixture
@@ -19,6 +31,20 @@ def test_get_languages(client):
     assert 'name' in languages['languages'][0]
 
 
+def test_languages_not_modified(client):
+    response = client.get("/languages")
+    etag = response.headers['etag']
+    response = client.get("/languages", headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.content == b''
+    response = client.get("/languages", headers={'If-None-Match': '"other"'})
+    assert response.status_code == 200
+
+
+def test_anonymous_has_no_selected_languages(client):
+    assert client.get("/selected_languages").json() == {}
+
+
 def test_draw_cards(client):
     response = client.post(
         "/draw_cards",
@@ -94,3 +120,179 @@ def test_answer_then_redraw(client):
     # # the answers we already sent are not in the new selection
     assert (card1['from_id'], card1['to_id']) in cards
     assert (card2['from_id'], card2['to_id']) in cards
+
+
+def test_anonymous_answers_have_no_daily_stats(client):
+    card = client.post(
+        "/draw_cards",
+        json=dict(
+            target_lang='deu',
+            source_langs=['eng', 'jap'],
+        )).json()[0]
+    for path, body in (
+            ("/register_answer", dict(
+                from_id=card['from_id'],
+                to_id=card['to_id'],
+                expected_answers=['some'],
+                given_answers=['some'],
+                correct=True,
+                repetition=False)),
+            ("/register_answers", [dict(
+                from_id=card['from_id'],
+                to_id=card['to_id'],
+                expected_answers=['some'],
+                given_answers=['other'],
+                correct=False,
+                repetition=True)])):
+        assert client.post(path, json=body).json() == 'OK'
+
+    async def anonymous_stats():
+        async with get_conn() as conn:
+            return await conn.fetchval(
+                'SELECT count(1) FROM revlog_daily WHERE account_id = 1')
+
+    # the loop of the test client, where the pool of the app is
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(anonymous_stats()) == 0
+
+
+def test_draw_cards_invalid_continuation(client):
+    response = client.post(
+        "/draw_cards",
+        json=dict(
+            target_lang='deu',
+            source_langs=['eng', 'jap'],
+            continuation='not a token',
+        ))
+    assert response.status_code == 400
+    assert 'error' in response.json()
+
+
+def test_register_answers_batch(client):
+    cards = client.post(
+        "/draw_cards",
+        json=dict(
+            target_lang='deu',
+            source_langs=['eng', 'jap'],
+        )).json()
+    answers = [
+        dict(
+            from_id=card['from_id'],
+            to_id=card['to_id'],
+            expected_answers=['some', 'token'],
+            given_answers=['some'],
+            correct=idx % 2 == 0,
+            repetition=False,
+        )
+        for idx, card in enumerate(cards[:3])
+    ]
+    # the same card again in the same session
+    answers.append(dict(answers[0], repetition=True))
+    ok_response = client.post("/register_answers", json=answers)
+    assert ok_response.status_code == 200
+    assert ok_response.json() == 'OK'
+
+
+def assert_overloaded(response, retry_after: int):
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response.headers['Retry-After'] == str(retry_after)
+    assert 'retry later' in response.json()['error']
+
+
+def test_saturated_class_is_rejected(client, monkeypatch):
+    # all the slots taken and no room in the queue
+    monkeypatch.setattr(card_endpoints, '_slots', asyncio.Semaphore(0))
+    monkeypatch.setattr(card_endpoints, 'max_queued', 0)
+    assert_overloaded(
+        client.get("/selected_languages"), card_endpoints.retry_after)
+    # the other classes are not affected
+    assert client.post("/register_answers", json=[]).json() == 'OK'
+
+
+def test_requests_shed_when_waiting_for_the_pool(client, monkeypatch):
+    monkeypatch.setattr(
+        pool_stats, 'waiting', bulk_endpoints.shed_pool_waiting)
+    assert_overloaded(client.get("/my_revision_stats"), 10)
+
+
+def test_higher_priority_requests_go_first(client, monkeypatch):
+    monkeypatch.setattr(answer_endpoints, 'queued', 1)
+    assert_overloaded(
+        client.get("/selected_languages"), card_endpoints.retry_after)
+
+
+class FakeWebSocket:
+    """The client of a quiz session, on the loop of the test client.
+
+    The WebSockets of the test client run on a loop of their own, where
+    the pool of the app cannot be used.
+    """
+
+    def __init__(self):
+        self.session = {}
+        # messages from the client, None to disconnect
+        self.from_client = asyncio.Queue()
+        self.to_client = asyncio.Queue()
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def receive_json(self):
+        message = await self.from_client.get()
+        if message is None:
+            raise WebSocketDisconnect(status.WS_1000_NORMAL_CLOSURE)
+        return message
+
+    async def send_text(self, text: str):
+        await self.to_client.put(json.loads(text))
+
+    async def close(self, code: int = status.WS_1000_NORMAL_CLOSURE):
+        self.close_code = code
+
+
+def run_session(client_side, cookie_session: dict = None):
+    """Run a quiz session with the given coroutine function as client."""
+    async def run():
+        websocket = FakeWebSocket()
+        websocket.session.update(cookie_session or {})
+        session = asyncio.ensure_future(quiz_session(websocket))
+        result = await client_side(websocket)
+        await websocket.from_client.put(None)
+        await session
+        return websocket, result
+    return asyncio.get_event_loop().run_until_complete(asyncio.wait_for(run(), 10))
+
+
+def test_quiz_session(client):
+    async def client_side(websocket):
+        await websocket.from_client.put(
+            dict(target_lang='deu', source_langs=['eng', 'jap']))
+        cards = await websocket.to_client.get()
+        # answering until only a few are left makes the server send more
+        for card in cards[:-5]:
+            await websocket.from_client.put(dict(
+                from_id=card['from_id'],
+                to_id=card['to_id'],
+                expected_answers=['some', 'token'],
+                given_answers=['some'],
+                correct=True,
+                repetition=False,
+            ))
+        more_cards = await websocket.to_client.get()
+        return cards, more_cards
+
+    websocket, (cards, more_cards) = run_session(client_side)
+    assert len(cards) == 10
+    assert len(more_cards) > 0
+    sent = {(c['from_id'], c['to_id']) for c in cards[-5:]}
+    assert all((c['from_id'], c['to_id']) not in sent for c in more_cards)
+    assert websocket.close_code is None
+
+
+def test_quiz_session_invalid_request(client):
+    async def client_side(websocket):
+        await websocket.from_client.put(dict(target_lang='deu'))
+
+    websocket, _ = run_session(client_side)
+    assert websocket.close_code == status.WS_1008_POLICY_VIOLATION
@@ -0,0 +1,46 @@
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from backend import dbutil
+from backend.app import app
+from backend.languages import LANGUAGE_CHANNEL, languages
+
+
+async def rename_german(name: str, notify: bool):
+    async with dbutil.get_conn() as conn:
+        await conn.execute(
+            "UPDATE language SET name = $1 WHERE iso693_3 = 'deu'", name)
+        if notify:
+            await conn.execute(f'NOTIFY {LANGUAGE_CHANNEL}')
+
+
+async def wait_for_german_name(name: str):
+    for _ in range(50):
+        if languages.by_iso['deu'][1] == name:
+            return True
+        await asyncio.sleep(0.1)
+    return False
+
+
+def test_languages_reloaded_after_losing_the_listening_connection():
+    with TestClient(app):
+        loop = asyncio.get_event_loop()
+        listen_pid = getattr(dbutil, '__listen_conn').get_server_pid()
+        try:
+            # changed while nobody listens, no notification can arrive
+            loop.run_until_complete(rename_german('Deutsch', notify=False))
+
+            async def drop_listen_conn():
+                async with dbutil.get_conn() as conn:
+                    await conn.execute(
+                        'SELECT pg_terminate_backend($1)', listen_pid)
+            loop.run_until_complete(drop_listen_conn())
+            assert loop.run_until_complete(wait_for_german_name('Deutsch'))
+            assert getattr(dbutil, '__listen_conn').get_server_pid() != listen_pid
+
+            # and it's listening again
+            loop.run_until_complete(rename_german('German', notify=True))
+            assert loop.run_until_complete(wait_for_german_name('German'))
+        finally:
+            loop.run_until_complete(rename_german('German', notify=False))
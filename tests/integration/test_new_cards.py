@@ -0,0 +1,237 @@
+import asyncio
+from math import floor
+from uuid import uuid4
+
+import asyncpg
+from fastapi.testclient import TestClient
+
+import backend.app
+from backend.app import app
+from backend.cards import peek_new_cards, start_fraction
+from backend.dbutil import config
+from test_draw_cards import run_session
+
+# ids of the languages in tests/database_content.sql
+ENGLISH = 1
+GERMAN = 4
+
+
+def with_conn(fn):
+    """Run a coroutine function with a connection to the DB."""
+    async def run():
+        conn = await asyncpg.connect(dsn=config.pg_conn_str)
+        try:
+            return await fn(conn)
+        finally:
+            await conn.close()
+    # not asyncio.run, which leaves no loop for the test client
+    return asyncio.get_event_loop().run_until_complete(run())
+
+
+def test_start_points_differ_between_users():
+    async def run(conn):
+        last_seq = await conn.fetchval('SELECT last_value FROM card_seq')
+        starts = {}
+        for account_id in range(1001, 1006):
+            _, frontier = await peek_new_cards(
+                conn, account_id, 'deu', ['eng'], 20)
+            starts[account_id] = frontier[ENGLISH][0]
+        return last_seq, starts
+
+    last_seq, starts = with_conn(run)
+    for account_id, start in starts.items():
+        assert start == floor(start_fraction(account_id) * last_seq)
+    assert len(set(starts.values())) > 1
+
+
+def test_frontier_advances_across_draws():
+    username = f'frontier-{uuid4().hex}'
+    quiz = dict(target_lang='deu', source_langs=['eng'])
+
+    async def get_frontier(conn):
+        return await conn.fetchrow(
+            """
+            SELECT f.start_seq, f.after_start_seq, f.before_start_seq
+            FROM new_card_frontier f
+                JOIN account_internal a ON a.id = f.account_id
+            WHERE a.username = $1 AND f.from_lang = $2""",
+            username,
+            ENGLISH)
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/register_user", json=dict(username=username, password='secret'))
+        assert response.status_code == 200
+        first_draw = client.post("/draw_cards", json=quiz).json()
+        first_frontier = with_conn(get_frontier)
+        assert first_frontier is not None
+
+        answered = [(card['from_id'], card['to_id']) for card in first_draw[:3]]
+        response = client.post(
+            "/register_answers",
+            json=[
+                dict(
+                    from_id=from_id,
+                    to_id=to_id,
+                    expected_answers=['some', 'token'],
+                    given_answers=['some', 'token'],
+                    correct=True,
+                    repetition=False,
+                )
+                for from_id, to_id in answered
+            ])
+        assert response.status_code == 200
+        second_draw = client.post("/draw_cards", json=quiz).json()
+        second_frontier = with_conn(get_frontier)
+
+    # the cards not answered are still new, in the same order
+    assert [(c['from_id'], c['to_id']) for c in second_draw] == [
+        (c['from_id'], c['to_id']) for c in first_draw[3:]]
+
+    async def get_seqs(conn):
+        rows = await conn.fetch(
+            'SELECT from_id, to_id, seq FROM card WHERE from_lang = $1',
+            ENGLISH)
+        return {(r['from_id'], r['to_id']): r['seq'] for r in rows}
+
+    seqs = with_conn(get_seqs)
+    start = first_frontier['start_seq']
+    assert second_frontier['start_seq'] == start
+    # the frontier is past the answered cards, up to the first one left on
+    # each side of the start
+    remaining = [seqs[(c['from_id'], c['to_id'])] for c in second_draw]
+    after = [seq for seq in remaining if seq >= start]
+    before = [seq for seq in remaining if seq < start]
+    assert len(after) + len(before) > 0
+    if len(after) > 0:
+        assert second_frontier['after_start_seq'] == min(after)
+    if len(before) > 0:
+        assert second_frontier['before_start_seq'] == min(before)
+
+
+def test_exhausted_side_is_skipped(monkeypatch):
+    # the German cards are the last ones, start in the middle of them
+    monkeypatch.setattr('backend.cards.start_fraction', lambda _: 0.75)
+    quiz = dict(target_lang='deu', source_langs=['eng'])
+
+    def card_ids(cards):
+        return {(c['from_id'], c['to_id']) for c in cards}
+
+    async def get_cards(conn):
+        rows = await conn.fetch(
+            'SELECT from_id, to_id, seq FROM card '
+            'WHERE from_lang = $1 AND to_lang = $2',
+            ENGLISH,
+            GERMAN)
+        return {(r['from_id'], r['to_id']): r['seq'] for r in rows}
+
+    with TestClient(app) as client:
+        account_id = register_user(client)
+
+        async def get_frontier(conn):
+            return await conn.fetchrow(
+                """
+                SELECT start_seq, after_start_seq, before_start_seq
+                FROM new_card_frontier
+                WHERE account_id = $1 AND from_lang = $2""",
+                account_id,
+                ENGLISH)
+
+        seqs = with_conn(get_cards)
+        cards = client.post("/draw_cards", json=quiz).json()
+        assert card_ids(cards) == set(seqs)
+        start = with_conn(get_frontier)['start_seq']
+        after = [c for c in cards if seqs[(c['from_id'], c['to_id'])] >= start]
+        before = [c for c in cards if seqs[(c['from_id'], c['to_id'])] < start]
+        assert len(after) > 0 and len(before) > 0
+
+        # all the cards after the start are seen
+        client.post("/register_answers", json=[answer(c) for c in after])
+        cards = client.post("/draw_cards", json=quiz).json()
+        assert card_ids(cards) == card_ids(before)
+        frontier = with_conn(get_frontier)
+        assert frontier['after_start_seq'] == max(seqs.values()) + 1
+
+        # and then all of them
+        client.post("/register_answers", json=[answer(c) for c in before])
+        assert client.post("/draw_cards", json=quiz).json() == []
+        frontier = with_conn(get_frontier)
+        assert frontier['after_start_seq'] == max(seqs.values()) + 1
+        assert frontier['before_start_seq'] == start
+
+
+def register_user(client) -> int:
+    """Register and log in a new user, returns its id."""
+    username = f'learner-{uuid4().hex}'
+    response = client.post(
+        "/register_user", json=dict(username=username, password='secret'))
+    assert response.status_code == 200
+
+    async def get_id(conn):
+        return await conn.fetchval(
+            'SELECT id FROM account_internal WHERE username = $1', username)
+    return with_conn(get_id)
+
+
+def answer(card: dict) -> dict:
+    return dict(
+        from_id=card['from_id'],
+        to_id=card['to_id'],
+        expected_answers=['some', 'token'],
+        given_answers=['some', 'token'],
+        correct=True,
+        repetition=False,
+    )
+
+
+def test_quiz_session_does_not_repeat_new_cards(monkeypatch):
+    # 10 cards in total, so the second batch has the 2 left
+    monkeypatch.setattr('backend.app.NEW_CARDS_PER_DRAW', 8)
+
+    async def client_side(websocket):
+        await websocket.from_client.put(
+            dict(target_lang='deu', source_langs=['eng']))
+        cards = await websocket.to_client.get()
+        # answering until only a few are left makes the server send more
+        for card in cards[:3]:
+            await websocket.from_client.put(answer(card))
+        more_cards = await websocket.to_client.get()
+        return cards, more_cards
+
+    with TestClient(app) as client:
+        account_id = register_user(client)
+        _, (cards, more_cards) = run_session(client_side, dict(id=account_id))
+    assert len(cards) == 8
+    unanswered = {(c['from_id'], c['to_id']) for c in cards[3:]}
+    assert len(more_cards) == 2
+    assert all((c['from_id'], c['to_id']) not in unanswered for c in more_cards)
+
+
+def test_prefetched_batch_is_full(monkeypatch):
+    monkeypatch.setattr('backend.app.NEW_CARDS_PER_DRAW', 4)
+    quiz = dict(target_lang='deu', source_langs=['eng'])
+    prefetcher = backend.app.prefetcher
+    taken = []
+
+    async def take(account_id, key):
+        batch = await type(prefetcher).take(prefetcher, account_id, key)
+        taken.append(batch)
+        return batch
+    monkeypatch.setattr(prefetcher, 'take', take)
+
+    with TestClient(app) as client:
+        register_user(client)
+        cards = client.post("/draw_cards", json=quiz).json()
+        assert len(cards) == 4
+        # the prefetch starts after 3 of them
+        for batch in (cards[:3], cards[3:]):
+            response = client.post(
+                "/register_answers", json=[answer(card) for card in batch])
+            assert response.status_code == 200
+        next_cards = client.post("/draw_cards", json=quiz).json()
+
+    assert taken[-1] is not None
+    # as many as a draw without prefetching, none of the answered ones
+    assert len(next_cards) == 4
+    answered = {(c['from_id'], c['to_id']) for c in cards}
+    assert all((c['from_id'], c['to_id']) not in answered for c in next_cards)
@@ -0,0 +1,40 @@
+import asyncio
+
+import asyncpg
+
+from backend.dbutil import config
+from backend.queries import queries
+
+
+def test_queries_on_reused_connection():
+    async def run():
+        # a single connection, so the second request gets the same one
+        pool = await asyncpg.create_pool(
+            dsn=config.pg_conn_str,
+            min_size=1,
+            max_size=1,
+            init=queries.prepare_all,
+        )
+        try:
+            backend_pids = set()
+            for _ in range(2):
+                async with pool.acquire() as conn:
+                    backend_pids.add(conn.get_server_pid())
+                    stats = await queries.get_user_stats.fetch(conn, 1)
+                    assert isinstance(stats, list)
+                    async with conn.transaction():
+                        cursor = await queries.get_user_stats.cursor(conn, 1)
+                        assert await cursor.fetch(10) == stats
+            assert len(backend_pids) == 1
+            async with pool.acquire() as conn:
+                # prepared by the init hook, and never again
+                prepared = await conn.fetchval(
+                    'SELECT count(*) FROM pg_prepared_statements '
+                    'WHERE statement = $1',
+                    queries.get_user_stats.sql)
+                assert prepared == 1
+        finally:
+            await pool.close()
+
+    # not asyncio.run, which leaves no loop for the test client
+    asyncio.get_event_loop().run_until_complete(run())
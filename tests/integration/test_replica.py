@@ -0,0 +1,61 @@
+import asyncio
+
+import asyncpg
+from fastapi.testclient import TestClient
+import pytest
+
+from backend import dbutil
+from backend.app import app
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+async def read_something():
+    async with dbutil.get_conn(readonly=True) as conn:
+        return await conn.fetchval('SELECT 1')
+
+
+class DownPool:
+    """A replica pool whose server went away."""
+
+    async def acquire(self, timeout=None):
+        raise OSError('Connection refused')
+
+
+def test_readonly_queries_use_the_replica(client, monkeypatch):
+    loop = asyncio.get_event_loop()
+    # the same DB plays the replica
+    replica_pool = loop.run_until_complete(
+        asyncpg.create_pool(dsn=dbutil.config.pg_conn_str, min_size=1, max_size=1))
+    monkeypatch.setattr(dbutil, '__replica_pool', replica_pool)
+    monkeypatch.setattr(dbutil.replica_status, 'usable', True)
+    try:
+        acquired = dbutil.replica_pool_stats.acquired
+        assert loop.run_until_complete(read_something()) == 1
+        assert dbutil.replica_pool_stats.acquired == acquired + 1
+        assert dbutil.replica_pool_stats.in_use == 0
+    finally:
+        loop.run_until_complete(replica_pool.close())
+
+
+def test_readonly_queries_fall_back_to_the_primary(client, monkeypatch):
+    monkeypatch.setattr(dbutil, '__replica_pool', DownPool())
+    monkeypatch.setattr(dbutil.replica_status, 'usable', True)
+    acquired = dbutil.pool_stats.acquired
+    loop = asyncio.get_event_loop()
+    assert loop.run_until_complete(read_something()) == 1
+    assert dbutil.pool_stats.acquired == acquired + 1
+    # not tried again until the monitor finds it working
+    assert not dbutil.replica_status.usable
+
+
+def test_lagging_replica_is_not_used():
+    status = dbutil.ReplicaStatus()
+    status.update(0.5)
+    assert status.usable
+    status.update(dbutil.config.pg_replica_max_lag + 1)
+    assert not status.usable
@@ -0,0 +1,185 @@
+import asyncio
+import csv
+import json
+from uuid import uuid4
+
+import asyncpg
+from fastapi.testclient import TestClient
+import pytest
+
+from backend import dbutil
+from backend.app import app
+from backend.revlog_buffer import RevlogBuffer
+
+# the test client asks for gzip by default
+NOT_COMPRESSED = {'Accept-Encoding': 'identity'}
+COMPRESSED = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+def answer_some_cards(client, username: str = None):
+    """Register a new user and answer 3 cards, returns their ids."""
+    response = client.post(
+        "/register_user",
+        json=dict(
+            username=username or f'exporter-{uuid4().hex}',
+            password='secret'))
+    assert response.status_code == 200
+    cards = client.post(
+        "/draw_cards",
+        json=dict(
+            target_lang='deu',
+            source_langs=['eng'],
+        )).json()
+    answered = [(card['from_id'], card['to_id']) for card in cards[:3]]
+    response = client.post(
+        "/register_answers",
+        json=[
+            dict(
+                from_id=from_id,
+                to_id=to_id,
+                expected_answers=['some', 'token'],
+                given_answers=['some'],
+                correct=True,
+                repetition=False,
+            )
+            for from_id, to_id in answered
+        ])
+    assert response.status_code == 200
+    return answered
+
+
+def test_export_jsonl(client):
+    answered = answer_some_cards(client)
+    response = client.get(
+        "/download/revision_logs.json", headers=NOT_COMPRESSED)
+    assert response.status_code == 200
+    assert 'content-encoding' not in response.headers
+    reviews = [json.loads(line) for line in response.text.splitlines()]
+    assert [(r['from_id'], r['to_id']) for r in reviews] == answered
+
+    compressed = client.get(
+        "/download/revision_logs.json", headers=COMPRESSED)
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.headers['vary'] == 'Accept-Encoding'
+    assert response.headers['vary'] == 'Accept-Encoding'
+    # the test client decompresses it
+    assert compressed.content == response.content
+
+    response = client.get(
+        "/download/revision_logs.json",
+        params=dict(
+            since=reviews[0]['review_time'],
+            since_from_id=reviews[0]['from_id'],
+            since_to_id=reviews[0]['to_id']),
+        headers=NOT_COMPRESSED)
+    assert [json.loads(line) for line in response.text.splitlines()] == reviews[1:]
+
+
+def test_export_csv(client):
+    answered = answer_some_cards(client)
+    response = client.get(
+        "/download/revision_logs.csv", headers=NOT_COMPRESSED)
+    assert response.status_code == 200
+    assert 'content-encoding' not in response.headers
+    header, *rows = csv.reader(response.text.splitlines())
+    assert header[:3] == ['from_id', 'to_id', 'review_time']
+    assert [(int(r[0]), int(r[1])) for r in rows] == answered
+
+    compressed = client.get(
+        "/download/revision_logs.csv", headers=COMPRESSED)
+    assert compressed.headers['content-encoding'] == 'gzip'
+    assert compressed.headers['vary'] == 'Accept-Encoding'
+    assert compressed.content == response.content
+
+    first_review = json.loads(client.get(
+        "/download/revision_logs.json", headers=NOT_COMPRESSED
+        ).text.splitlines()[0])
+    response = client.get(
+        "/download/revision_logs.csv",
+        params=dict(
+            since=first_review['review_time'],
+            since_from_id=first_review['from_id'],
+            since_to_id=first_review['to_id']),
+        headers=NOT_COMPRESSED)
+    assert list(csv.reader(response.text.splitlines())) == [header] + rows[1:]
+
+
+def test_export_resumed_within_the_same_review_time(client):
+    username = f'exporter-{uuid4().hex}'
+    answered = answer_some_cards(client, username)
+
+    async def same_review_time():
+        async with dbutil.get_conn() as conn:
+            await conn.execute(
+                """
+                UPDATE revlog r SET review_time = '2020-01-01T00:00:00Z'
+                FROM account_internal a
+                WHERE a.id = r.account_id AND a.username = $1""",
+                username)
+    asyncio.get_event_loop().run_until_complete(same_review_time())
+
+    response = client.get(
+        "/download/revision_logs.json", headers=NOT_COMPRESSED)
+    reviews = [json.loads(line) for line in response.text.splitlines()]
+    # the ties are in card order
+    assert [(r['from_id'], r['to_id']) for r in reviews] == sorted(answered)
+    for i, review in enumerate(reviews):
+        response = client.get(
+            "/download/revision_logs.json",
+            params=dict(
+                since=review['review_time'],
+                since_from_id=review['from_id'],
+                since_to_id=review['to_id']),
+            headers=NOT_COMPRESSED)
+        assert [
+            json.loads(line) for line in response.text.splitlines()
+        ] == reviews[i + 1:]
+
+
+def test_buffered_answers_flushed_on_shutdown(monkeypatch):
+    # only written when full or stopped
+    buffer = RevlogBuffer(max_rows=100, flush_rows=100, flush_interval=3600)
+    monkeypatch.setattr('backend.app.revlog_buffer', buffer)
+    monkeypatch.setattr('backend.dbutil.revlog_buffer', buffer)
+    username = f'buffered-{uuid4().hex}'
+
+    async def count_revlogs():
+        conn = await asyncpg.connect(dsn=dbutil.config.pg_conn_str)
+        try:
+            return await conn.fetchval(
+                """
+                SELECT count(*) FROM revlog r
+                    JOIN account_internal a ON a.id = r.account_id
+                WHERE a.username = $1""",
+                username)
+        finally:
+            await conn.close()
+
+    # not asyncio.run, which leaves no loop for the test client
+    loop = asyncio.get_event_loop()
+    with TestClient(app) as client:
+        response = client.post(
+            "/register_user", json=dict(username=username, password='secret'))
+        assert response.status_code == 200
+        card = client.post(
+            "/draw_cards",
+            json=dict(target_lang='deu', source_langs=['eng'])).json()[0]
+        response = client.post(
+            "/register_answer",
+            json=dict(
+                from_id=card['from_id'],
+                to_id=card['to_id'],
+                expected_answers=['some', 'token'],
+                given_answers=['some'],
+                correct=False,
+                repetition=False,
+            ))
+        assert response.status_code == 200
+        assert loop.run_until_complete(count_revlogs()) == 0
+    assert loop.run_until_complete(count_revlogs()) == 1
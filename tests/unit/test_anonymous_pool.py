@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from backend.anonymous_pool import AnonymousCardPool
+
+
+def card(from_id, to_id):
+    return dict(from_id=from_id, to_id=to_id)
+
+
+def test_cancelled_draw_does_not_cancel_the_others():
+    loads = []
+
+    async def load(target_lang, source_langs):
+        loads.append(target_lang)
+        await asyncio.sleep(0.05)
+        return [card(1, 10), card(2, 20)]
+
+    async def session():
+        pool = AnonymousCardPool(pool_size=10, ttl=60, max_pools=10)
+        pool._load = load
+        first = asyncio.ensure_future(pool.draw('deu', ['eng'], 2))
+        second = asyncio.ensure_future(pool.draw('deu', ['eng'], 2))
+        await asyncio.sleep(0.01)
+        # the client of the first draw went away
+        first.cancel()
+        cards = await second
+        # the pool is still there for the next draws
+        return cards, await pool.draw('deu', ['eng'], 1)
+
+    cards, more_cards = asyncio.get_event_loop().run_until_complete(session())
+    assert len(cards) == 2
+    assert len(more_cards) == 1
+    assert loads == ['deu']
+
+
+def test_failed_load_is_retried():
+    loads = []
+
+    async def load(target_lang, source_langs):
+        loads.append(target_lang)
+        if len(loads) == 1:
+            raise OSError('Connection refused')
+        return [card(1, 10)]
+
+    async def session():
+        pool = AnonymousCardPool(pool_size=10, ttl=60, max_pools=10)
+        pool._load = load
+        with pytest.raises(OSError):
+            await pool.draw('deu', ['eng'], 1)
+        return await pool.draw('deu', ['eng'], 1)
+
+    assert asyncio.get_event_loop().run_until_complete(session()) == [card(1, 10)]
+    assert loads == ['deu', 'deu']
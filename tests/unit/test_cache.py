@@ -0,0 +1,23 @@
+from time import sleep
+
+from backend.cache import TTLCache
+
+
+def test_least_recently_used_is_evicted():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    # now b is the least recently used
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+def test_entries_expire():
+    cache = TTLCache(max_entries=10, ttl=0.01)
+    cache.put('a', 1)
+    sleep(0.02)
+    assert cache.get('a') is None
+    assert len(cache) == 0
@@ -0,0 +1,15 @@
+from backend.metrics import Histogram
+
+
+def test_histogram_buckets_are_cumulative():
+    hist = Histogram('test_seconds', 'Test', ('route',), buckets=(0.1, 1))
+    hist.observe(0.05, '/a')
+    hist.observe(0.1, '/a')
+    hist.observe(3, '/a')
+    assert hist.samples() == [
+        'test_seconds_bucket{route="/a",le="0.1"} 2',
+        'test_seconds_bucket{route="/a",le="1"} 2',
+        'test_seconds_bucket{route="/a",le="+Inf"} 3',
+        'test_seconds_sum{route="/a"} 3.15',
+        'test_seconds_count{route="/a"} 3',
+    ]
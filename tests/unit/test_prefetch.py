@@ -0,0 +1,33 @@
+import asyncio
+
+from backend.prefetch import BatchPrefetcher
+
+
+def card(from_id, to_id):
+    return dict(from_id=from_id, to_id=to_id)
+
+
+def test_prefetch_after_fraction_answered():
+    draws = []
+
+    async def draw(account_id, key, exclude):
+        draws.append(exclude)
+        return [card(3, 30), card(4, 40)]
+
+    async def session():
+        prefetcher = BatchPrefetcher(draw, after_fraction=0.5, ttl=60, max_users=10)
+        prefetcher.served(7, 'deu', [card(1, 10), card(2, 20)])
+        # not part of the batch, does not count
+        prefetcher.answered(7, [(9, 90)])
+        assert await prefetcher.take(7, 'deu') is None
+        prefetcher.served(7, 'deu', [card(1, 10), card(2, 20)])
+        prefetcher.answered(7, [(1, 10)])
+        prefetcher.answered(7, [(3, 30)])
+        assert await prefetcher.take(7, 'ita') is None
+        return await prefetcher.take(7, 'deu')
+
+    cards, answered = asyncio.get_event_loop().run_until_complete(session())
+    assert draws == [{(1, 10), (2, 20)}]
+    assert cards == [card(3, 30), card(4, 40)]
+    # answered while the next batch was being drawn
+    assert answered == {(3, 30)}
@@ -0,0 +1,19 @@
+import asyncio
+
+import pytest
+
+from backend.queries import queries
+
+
+def test_all_queries_are_registered():
+    assert queries.draw_new_cards.n_args == 5
+    assert queries.get_user_stats.n_args == 1
+    with pytest.raises(AttributeError):
+        queries.not_a_query
+
+
+def test_argument_count_is_checked():
+    with pytest.raises(TypeError):
+        # the connection is not used, the check comes first
+        asyncio.get_event_loop().run_until_complete(
+            queries.get_user_stats.fetch(None, 1, 2))
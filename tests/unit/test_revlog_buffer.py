@@ -0,0 +1,94 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from backend.revlog_buffer import RevlogBuffer
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.rows.extend(records)
+
+    async def execute(self, sql, *args):
+        # the daily stats
+        pass
+
+
+def connections(conn: FakeConnection, failures: int):
+    """A get_conn failing the given number of times, then giving conn."""
+    attempts = []
+
+    @asynccontextmanager
+    async def get_conn():
+        attempts.append(None)
+        if len(attempts) <= failures:
+            raise OSError('Connection refused')
+        yield conn
+    return get_conn, attempts
+
+
+def add_answers(buffer: RevlogBuffer, n: int):
+    for from_id in range(n):
+        yield buffer.add(from_id, 10, 2, ['a'], ['a'], True)
+
+
+def test_rows_written_when_the_db_is_back():
+    conn = FakeConnection()
+    get_conn, attempts = connections(conn, failures=2)
+
+    async def session():
+        buffer = RevlogBuffer(max_rows=100, flush_rows=3, flush_interval=0.01)
+        buffer.start(get_conn)
+        for add in add_answers(buffer, 3):
+            await add
+        # a couple of failed flushes
+        await asyncio.sleep(0.1)
+        for add in add_answers(buffer, 2):
+            await add
+        await buffer.stop()
+
+    asyncio.get_event_loop().run_until_complete(session())
+    assert len(attempts) > 2
+    # all of them, once
+    assert sorted(row[0] for row in conn.rows) == [0, 0, 1, 1, 2]
+
+
+def test_rows_tried_again_on_stop():
+    conn = FakeConnection()
+    get_conn, attempts = connections(conn, failures=1)
+
+    async def session():
+        # only written on stop, after the first attempt failed
+        buffer = RevlogBuffer(max_rows=100, flush_rows=2, flush_interval=60)
+        buffer.start(get_conn)
+        for add in add_answers(buffer, 2):
+            await add
+        await asyncio.sleep(0.01)
+        await asyncio.wait_for(buffer.stop(), 5)
+
+    asyncio.get_event_loop().run_until_complete(session())
+    assert len(attempts) == 2
+    assert len(conn.rows) == 2
+
+
+def test_stop_with_the_db_down():
+    conn = FakeConnection()
+    get_conn, attempts = connections(conn, failures=1000)
+
+    async def session():
+        buffer = RevlogBuffer(max_rows=100, flush_rows=2, flush_interval=0.01)
+        buffer.start(get_conn)
+        for add in add_answers(buffer, 3):
+            await add
+        await asyncio.sleep(0.05)
+        await asyncio.wait_for(buffer.stop(), 5)
+
+    asyncio.get_event_loop().run_until_complete(session())
+    assert len(attempts) >= 2
+    assert conn.rows == []
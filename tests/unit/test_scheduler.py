@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from backend.scheduler import FSRS, SM2, get_scheduler, new_states, replay
+
+
+def test_sm2_new_cards():
+    states, due = SM2().review(
+        new_states(2), np.array([True, False]), np.zeros(2))
+    assert list(due) == [1, 1]
+    assert list(states['i_factor']) == [1, 1]
+    assert states['ef_factor'] == pytest.approx([2.65, 2.3])
+    # the fields of other schedulers are untouched
+    assert np.isnan(states['stability']).all()
+
+
+def test_sm2_reviewed_cards():
+    states = new_states(4)
+    states['i_factor'] = np.array([1.0, 6.0, 15.0, 6.0])
+    states['ef_factor'] = np.array([2.65, 2.5, 1.3, 2.5])
+    states, due = SM2().review(
+        states, np.array([True, True, True, False]), np.full(4, 3.0))
+    # the due date uses the previous interval
+    assert list(due) == [1, 6, 15, 1]
+    assert list(states['i_factor']) == [6, 15, 20, 1]
+    assert states['ef_factor'] == pytest.approx([2.8, 2.65, 1.45, 2.5])
+
+
+def test_sm2_rounds_halves_to_even():
+    states = new_states(2)
+    states['i_factor'] = np.array([5.0, 3.0])
+    states['ef_factor'] = np.array([2.5, 2.5])
+    states, _ = SM2().review(states, np.array([True, True]), np.full(2, 3.0))
+    # 12.5 and 7.5, rounded like round(double precision) in Postgres
+    assert list(states['i_factor']) == [12, 8]
+
+
+def test_fsrs_intervals():
+    fsrs = FSRS()
+    states, due = fsrs.review(
+        new_states(2), np.array([True, False]), np.zeros(2))
+    assert due[0] > due[1]
+    # remembering after the due date makes the interval grow
+    states, due_after = fsrs.review(states, np.array([True, True]), due)
+    assert (due_after > due).all()
+    # forgetting makes it shrink
+    _, due_forgot = fsrs.review(states, np.array([False, False]), due_after)
+    assert (due_forgot < due_after).all()
+
+
+def test_replay_matches_sequential_reviews():
+    card_idx = np.array([0, 0, 0, 1, 1, 2])
+    review_days = np.array([0.0, 1.0, 7.0, 0.0, 1.0, 3.0])
+    correct = np.array([True, True, False, False, True, True])
+    sm2 = SM2()
+    final, due = replay(sm2, card_idx, review_days, correct)
+
+    states = new_states(1)
+    expected = []
+    for c, ok in zip(card_idx[:3], correct[:3]):
+        states, d = sm2.review(states, np.array([ok]), np.array([1.0]))
+        expected.append(d[0])
+    assert list(due[:3]) == expected
+    assert final['i_factor'][0] == states['i_factor'][0]
+
+
+def test_unknown_scheduler():
+    with pytest.raises(ValueError):
+        get_scheduler('leitner')